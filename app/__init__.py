@@ -8,9 +8,58 @@ def create_app():
     from .models import db
     db.init_app(app)
 
-    # Create tables if they don't exist
-    with app.app_context():
-        db.create_all()
+    # WAL, busy timeout and cache pragmas on every SQLite connection
+    from . import pragmas
+    pragmas.init_app(app, db)
+
+    # Schema migrations (`flask db upgrade`), run at startup unless
+    # CREATE_TABLES_ON_STARTUP is off
+    from . import schema
+    schema.init_app(app)
+
+    # `flask backfill-student-stats` builds summaries missing for older attempts
+    from . import stats
+    stats.init_app(app)
+
+    # Size the per-worker answer key cache used when grading
+    from .grading import answer_keys
+    answer_keys.maxsize = app.config.get("ANSWER_KEY_CACHE_SIZE", 256)
+
+    # Per-worker TTL cache of the teacher dashboard counters
+    from .dashboard import dashboard_cache
+    dashboard_cache.ttl = app.config.get("DASHBOARD_CACHE_SECONDS", 30)
+
+    # Per-worker cache of quiz delivery payloads and rendered quiz pages
+    from .delivery import delivery_cache
+    delivery_cache.maxsize = app.config.get("QUIZ_DELIVERY_CACHE_SIZE", 256)
+
+    # Optional write-behind submissions; replays journals left by crashed workers
+    from .journal import submission_journal
+    submission_journal.init_app(app)
+
+    # Background export jobs and their artifact cache
+    from .export_jobs import export_jobs
+    export_jobs.init_app(app)
+
+    # `flask rebuild-rollups` recomputes the daily analytics rollups
+    from . import rollups
+    rollups.init_app(app)
+
+    # Quiz full-text search index (FTS5 on SQLite) and `flask rebuild-search-index`
+    from . import search
+    search.init_app(app)
+
+    # `flask import-quizzes` loads CSV / JSON-lines / DOCX question banks
+    from . import importer
+    importer.init_app(app)
+
+    # Resized, fingerprinted static images and the asset_url template helper
+    from . import assets
+    assets.init_app(app)
+
+    # ETag revision of the deployed templates for the conditional GET views
+    from . import http_cache
+    http_cache.init_app(app)
 
     # Import and register blueprints
     from .routes import main
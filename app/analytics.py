@@ -0,0 +1,151 @@
+"""Teacher analytics aggregates.
+
+The performance trend used to approximate months with ``timedelta(days=30 * i)`` and
+run one AVG query per bucket, followed by separate subject and quiz aggregations.
+Everything here reads the daily rollups maintained by app.rollups instead of the
+attempt history: the trend is one query grouping DailyQuizStats by a calendar period
+key (month or ISO week, computed by the database), and the cards sum the quiz and
+subject rollups, so the cost follows days x dimensions rather than total attempts.
+"""
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from .models import db, Quiz, Subject, DailyQuizStats, DailySubjectStats
+from .stats import week_start
+
+# allowed trend ranges per granularity (first entry is the default)
+RANGES = {
+    'month': (6, 12, 24),
+    'week': (12, 4, 8, 26, 52),
+}
+# most x-axis labels drawn on the 600px wide chart
+MAX_LABELS = 8
+
+
+def parse_range(args):
+    """Read ``period`` (month|week) and ``n`` from request args, falling back to defaults."""
+    period = args.get('period') if args.get('period') in RANGES else 'month'
+    try:
+        n = int(args.get('n') or 0)
+    except (TypeError, ValueError):
+        n = 0
+    if n not in RANGES[period]:
+        n = RANGES[period][0]
+    return period, n
+
+
+def _add_months(day, months):
+    index = day.year * 12 + (day.month - 1) + months
+    return day.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def period_starts(period, n, now=None):
+    """Start dates of the last `n` calendar periods, oldest first, including the current one."""
+    today = (now or datetime.utcnow()).date()
+    if period == 'week':
+        current = week_start(today)
+        return [current - timedelta(weeks=i) for i in range(n - 1, -1, -1)]
+    current = today.replace(day=1)
+    return [_add_months(current, -i) for i in range(n - 1, -1, -1)]
+
+
+def period_key(column, period):
+    """SQL expression naming the period of `column`: 'YYYY-MM' or the week's Monday 'YYYY-MM-DD'."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        if period == 'week':
+            return func.to_char(func.date_trunc('week', column), 'YYYY-MM-DD')
+        return func.to_char(func.date_trunc('month', column), 'YYYY-MM')
+    if dialect in ('mysql', 'mariadb'):
+        if period == 'week':
+            return func.date_format(func.subdate(column, func.weekday(column)), '%Y-%m-%d')
+        return func.date_format(column, '%Y-%m')
+    # SQLite: 'weekday 0' moves forward to Sunday, six days back is that week's Monday
+    if period == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.strftime('%Y-%m', column)
+
+
+def _key(start, period):
+    return start.strftime('%Y-%m-%d') if period == 'week' else start.strftime('%Y-%m')
+
+
+def performance_trend(period='month', n=6, now=None):
+    """Return [{'key', 'start', 'avg_percent', 'attempts'}] for the last `n` periods."""
+    starts = period_starts(period, n, now)
+    R = DailyQuizStats
+    key = period_key(R.day, period)
+    rows = (
+        db.session.query(key.label('period'), func.sum(R.percent_sum), func.sum(R.percent_count))
+        .filter(R.day >= starts[0])
+        .group_by(key)
+        .all()
+    )
+    found = {str(p): (total, count) for p, total, count in rows}
+    trend = []
+    for start in starts:
+        total, count = found.get(_key(start, period), (None, 0))
+        count = int(count or 0)
+        trend.append({
+            'key': _key(start, period),
+            'start': start,
+            'avg_percent': round(float(total) / count, 1) if count else None,
+            'attempts': count,
+        })
+    return trend
+
+
+def chart(trend, period):
+    """SVG points, circles and x-axis labels for the 600x220 trend chart."""
+    count = len(trend)
+    step = 500.0 / (count - 1) if count > 1 else 0
+    # y-axis: percent 100 -> y=20, 0 -> y=180; missing points sit on the baseline
+    points, circles, labels = [], [], []
+    label_every = max(1, math.ceil(count / MAX_LABELS))
+    long_range = period == 'month' and count > 12
+    for i, bucket in enumerate(trend):
+        x = int(60 + i * step)
+        v = bucket['avg_percent']
+        y = 180 if v is None else 20 + (100 - max(0, min(100, v))) * (160 / 100.0)
+        points.append(f"{x},{int(y)}")
+        circles.append({'x': x, 'y': int(y), 'label': (str(v) + '%' if v is not None else 'n/a')})
+        if i % label_every == 0 or i == count - 1:
+            if period == 'week':
+                text = bucket['start'].strftime('%d %b')
+            else:
+                text = bucket['start'].strftime("%b '%y" if long_range else '%b')
+            labels.append({'x': x, 'text': text})
+    return ' '.join(points), circles, labels
+
+
+def _rollup_averages(model, dim_id, dim_label, on, limit=None):
+    total, count = func.sum(model.percent_sum), func.sum(model.percent_count)
+    query = (
+        db.session.query(dim_id, dim_label, total, count)
+        .join(model, on)
+        .group_by(dim_id, dim_label)
+        .having(count > 0)
+        .order_by((total / count).desc())
+    )
+    if limit:
+        query = query.limit(limit)
+    return [(r[0], r[1], round(float(r[2]) / int(r[3]), 1), int(r[3])) for r in query.all()]
+
+
+def performance_cards(quiz_limit=6):
+    """Subject and quiz performance cards from the daily rollups.
+
+    Returns (subjects, quizzes): subjects ordered by average percent with their
+    attempt counts, and the top `quiz_limit` quizzes by average percent.
+    """
+    subjects = [
+        {'name': name, 'avg_percent': avg, 'attempts': count}
+        for _, name, avg, count in _rollup_averages(DailySubjectStats, Subject.id, Subject.name, DailySubjectStats.subject_id == Subject.id)
+    ]
+    quizzes = [
+        {'id': quiz_id, 'title': title, 'avg_percent': avg, 'attempts': count}
+        for quiz_id, title, avg, count in _rollup_averages(DailyQuizStats, Quiz.id, Quiz.title, DailyQuizStats.quiz_id == Quiz.id, limit=quiz_limit)
+    ]
+    return subjects, quizzes
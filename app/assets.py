@@ -0,0 +1,178 @@
+"""Fingerprinted, resized static images.
+
+The sidebar logo is a 677 KB PNG shown at 50px on every page. The images listed in
+``ASSET_IMAGES`` are rendered (with Pillow) into WebP and PNG variants at the widths
+they are displayed at and written to ``static/build`` under names carrying a digest
+of their content, recorded in ``static/build/manifest.json``. Templates ask for
+them with ``asset_url(filename, width, fmt)`` and, since a changed image gets a new
+name, fingerprinted files are served with a far-future, immutable Cache-Control.
+
+Assets are built at startup when the manifest is missing or a source changed, or
+ahead of time with ``flask build-assets``. Without Pillow the originals are only
+fingerprinted, and asset_url falls back to them.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+
+import click
+from flask import url_for, request
+from flask.cli import with_appcontext
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+FORMATS = ('webp', 'png')
+# fingerprinted files never change, so browsers may keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _digest(path):
+    with open(path, 'rb') as fh:
+        return hashlib.sha256(fh.read()).hexdigest()
+
+
+def _key(filename, width=None, fmt=None):
+    return f"{filename}|{width or ''}|{fmt or ''}"
+
+
+def _write(path, save):
+    # write under a temporary name so another worker never serves a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        save(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class Assets:
+    def __init__(self):
+        self.static_folder = None
+        self.images = {}
+        self.manifest = {}
+
+    @property
+    def build_folder(self):
+        return os.path.join(self.static_folder, BUILD_DIR)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.images = app.config.get('ASSET_IMAGES') or {}
+        self.manifest = self._load()
+        if app.config.get('ASSET_BUILD_ON_STARTUP', True) and self.stale():
+            try:
+                self.build()
+            except OSError as e:
+                app.logger.warning('could not build static assets: %s', e)
+        app.add_template_global(asset_url)
+        app.after_request(_cache_fingerprinted)
+        app.cli.add_command(build_assets_command)
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.build_folder, MANIFEST), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def stale(self):
+        """True if a configured image is missing from the manifest or has changed."""
+        if not self.manifest.get('resized') and importlib.util.find_spec('PIL') is not None:
+            # built without Pillow: only the originals were fingerprinted
+            return True
+        sources = self.manifest.get('sources', {})
+        for filename in self.images:
+            path = os.path.join(self.static_folder, filename)
+            if os.path.exists(path) and sources.get(filename) != _digest(path):
+                return True
+        return False
+
+    def build(self):
+        """Render every configured image; returns the new manifest."""
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = None
+        os.makedirs(self.build_folder, exist_ok=True)
+        sources, files = {}, {}
+        for filename, widths in self.images.items():
+            path = os.path.join(self.static_folder, filename)
+            if not os.path.exists(path):
+                continue
+            sources[filename] = _digest(path)
+            stem, ext = os.path.splitext(os.path.basename(filename))
+            # the original, fingerprinted
+            name = f"{stem}.{sources[filename][:12]}{ext}"
+            _write(os.path.join(self.build_folder, name), lambda tmp: _copy(path, tmp))
+            files[_key(filename)] = f"{BUILD_DIR}/{name}"
+            if Image is None:
+                continue
+            with Image.open(path) as original:
+                original.load()
+                for width in widths:
+                    height = max(1, round(original.height * width / original.width))
+                    resized = original.convert('RGBA').resize((width, height), Image.LANCZOS)
+                    for fmt in FORMATS:
+                        out = os.path.join(self.build_folder, f"{stem}-{width}.{os.getpid()}.tmp.{fmt}")
+                        if fmt == 'webp':
+                            resized.save(out, 'WEBP', quality=85, method=6)
+                        else:
+                            resized.save(out, 'PNG', optimize=True)
+                        # named after the rendered bytes, moved into place complete
+                        name = f"{stem}-{width}.{_digest(out)[:12]}.{fmt}"
+                        os.replace(out, os.path.join(self.build_folder, name))
+                        files[_key(filename, width, fmt)] = f"{BUILD_DIR}/{name}"
+        self.manifest = {'sources': sources, 'files': files, 'resized': Image is not None}
+        _write(os.path.join(self.build_folder, MANIFEST), lambda tmp: _dump(self.manifest, tmp))
+        # drop variants of earlier versions of the images
+        current = {os.path.basename(name) for name in files.values()} | {MANIFEST}
+        for name in os.listdir(self.build_folder):
+            if name not in current and '.tmp' not in name:
+                os.remove(os.path.join(self.build_folder, name))
+        return self.manifest
+
+    def lookup(self, filename, width=None, fmt=None):
+        files = self.manifest.get('files', {})
+        return files.get(_key(filename, width, fmt)) or files.get(_key(filename))
+
+
+def _copy(src, dst):
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        fout.write(fin.read())
+
+
+def _dump(manifest, path):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+
+
+assets = Assets()
+
+
+def asset_url(filename, width=None, fmt=None):
+    """URL of the `width` px `fmt` variant of a static image, falling back to the
+    fingerprinted original and then to the plain static file."""
+    built = assets.lookup(filename, width, fmt)
+    return url_for('static', filename=built or filename)
+
+
+def _cache_fingerprinted(response):
+    if request.endpoint == 'static' and (request.view_args or {}).get('filename', '').startswith(BUILD_DIR + '/'):
+        if response.status_code in (200, 304):
+            response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Build the resized, fingerprinted static images."""
+    manifest = assets.build()
+    for key, name in sorted(manifest['files'].items()):
+        click.echo(f"{name}  ({key.replace('|', ' ').strip()})")
+
+
+def init_app(app):
+    assets.init_app(app)
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from .models import db, Student, Teacher
+from .http_cache import bump, CATALOG
 
 auth = Blueprint("auth", __name__)
 
@@ -74,6 +75,8 @@ def register_teacher():
         teacher = Teacher(name=name, email=email)
         teacher.set_password(password)
         db.session.add(teacher)
+        # teacher names are listed in the quiz catalog
+        bump(CATALOG)
         db.session.commit()
         flash("Registration successful. Please log in.")
         return redirect(url_for("auth.login_teacher"))
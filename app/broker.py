@@ -0,0 +1,65 @@
+"""Publish/subscribe broker for pushing new messages and read receipts.
+
+Events are rows in the MessageEvent table, written in the same transaction as the
+message (or read update) they describe, so every gunicorn worker sees them no matter
+which worker handled the send. Subscribers follow a conversation by event id: an
+in-process condition wakes streams served by the publishing worker immediately, and
+streams in other workers notice the new row on their next short, indexed poll.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+
+from .models import db, MessageEvent
+
+# events are only needed until every open stream has caught up
+EVENT_RETENTION = timedelta(hours=24)
+PRUNE_EVERY = 500
+
+_wakeup = threading.Condition()
+
+
+def publish(conversation_id, kind, payload):
+    """Queue an event in the current transaction; call notify() after commit."""
+    event = MessageEvent(conversation_id=conversation_id, kind=kind, payload=json.dumps(payload))
+    db.session.add(event)
+    db.session.flush()
+    if event.id % PRUNE_EVERY == 0:
+        cutoff = datetime.utcnow() - EVENT_RETENTION
+        MessageEvent.query.filter(MessageEvent.created_at < cutoff).delete(synchronize_session=False)
+    return event
+
+
+def notify():
+    """Wake the streams of this worker after an event has been committed."""
+    with _wakeup:
+        _wakeup.notify_all()
+
+
+def wait(timeout):
+    with _wakeup:
+        _wakeup.wait(timeout)
+
+
+def latest_event_id(conversation_id):
+    row = (
+        db.session.query(MessageEvent.id)
+        .filter(MessageEvent.conversation_id == conversation_id)
+        .order_by(MessageEvent.id.desc())
+        .first()
+    )
+    return row[0] if row else 0
+
+
+def events_after(conversation_id, after_id, limit=100):
+    return (
+        MessageEvent.query
+        .filter(MessageEvent.conversation_id == conversation_id, MessageEvent.id > after_id)
+        .order_by(MessageEvent.id.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def format_sse(event):
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {event.payload}\n\n"
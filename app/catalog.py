@@ -0,0 +1,94 @@
+"""Keyset-paginated quiz catalog for students.
+
+One page of the catalog costs a constant number of queries: the quizzes are loaded
+together with their subject and teacher, and the question count comes from a
+correlated subquery instead of lazily loading every ``quiz.questions`` list.
+Pages are addressed by a cursor on the quiz id (newest first, ids grow with creation
+time) so deep pages are as cheap as the first one.
+"""
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+
+from .models import db, Quiz, Question
+
+DIFFICULTIES = ('Beginner', 'Intermediate', 'Advanced')
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_filters(args):
+    """Read catalog filters from request args, ignoring invalid values."""
+    def as_int(name):
+        try:
+            return int(args.get(name)) if args.get(name) else None
+        except (TypeError, ValueError):
+            return None
+
+    difficulty = args.get('difficulty') or None
+    try:
+        limit = int(args.get('limit') or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    return {
+        'q': (args.get('q') or '').strip(),
+        'subject_id': as_int('subject'),
+        'teacher_id': as_int('teacher'),
+        'difficulty': difficulty if difficulty in DIFFICULTIES else None,
+        'after': as_int('after'),
+        # position in relevance-ranked search results (see app.search)
+        'offset': max(0, as_int('offset') or 0),
+        'limit': max(1, min(limit, MAX_PAGE_SIZE)),
+    }
+
+
+def question_count():
+    """Correlated subquery counting a quiz's questions."""
+    return (
+        select(func.count(Question.id))
+        .where(Question.quiz_id == Quiz.id)
+        .correlate(Quiz)
+        .scalar_subquery()
+        .label('question_count')
+    )
+
+
+def catalog_page(filters):
+    """Return (rows, next_cursor) where rows are (quiz, question_count) tuples.
+
+    Text searches (``filters['q']``) are ranked by relevance and go through
+    app.search instead.
+    """
+    query = (
+        db.session.query(Quiz, question_count())
+        .options(joinedload(Quiz.subject), joinedload(Quiz.teacher))
+    )
+    if filters.get('subject_id'):
+        query = query.filter(Quiz.subject_id == filters['subject_id'])
+    if filters.get('teacher_id'):
+        query = query.filter(Quiz.teacher_id == filters['teacher_id'])
+    if filters.get('difficulty'):
+        query = query.filter(Quiz.difficulty == filters['difficulty'])
+    if filters.get('after'):
+        query = query.filter(Quiz.id < filters['after'])
+
+    limit = filters.get('limit') or DEFAULT_PAGE_SIZE
+    rows = query.order_by(Quiz.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0].id
+    return rows, next_cursor
+
+
+def serialize_row(quiz, count):
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'difficulty': quiz.difficulty,
+        'time_limit': quiz.time_limit,
+        'question_count': int(count or 0),
+        'subject': quiz.subject.name if quiz.subject else None,
+        'teacher': quiz.teacher.name if quiz.teacher else None,
+        'created_at': quiz.created_at.isoformat() if quiz.created_at else None,
+    }
@@ -0,0 +1,87 @@
+"""Teacher dashboard counters.
+
+The dashboard used to run a separate count() for total and new quizzes, total and
+new subjects and total students on every page view. `dashboard_counts` computes all
+of them in one statement (conditional aggregates over the teacher's quizzes plus
+scalar subqueries for the global totals), and `dashboard_cache` keeps the result per
+teacher for a few seconds. Creating, editing or deleting a quiz or subject
+invalidates the entries it affects; other workers catch up when their TTL expires.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case, select
+
+from .models import db, Quiz, Subject, Student
+
+# window for the "new this week" deltas
+NEW_DAYS = 7
+
+
+def dashboard_counts(teacher_id=None, now=None):
+    """Return the dashboard counters for `teacher_id` (all quizzes if None) in one query."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=NEW_DAYS)
+    is_new = Quiz.created_at >= cutoff
+    students = select(func.count(Student.id)).scalar_subquery()
+    if teacher_id:
+        # distinct subjects used by this teacher's quizzes (count ignores NULLs)
+        subjects = func.count(func.distinct(Quiz.subject_id))
+    else:
+        subjects = select(func.count(Subject.id)).scalar_subquery()
+    query = db.session.query(
+        func.count(Quiz.id),
+        func.count(case((is_new, Quiz.id))),
+        subjects,
+        func.count(func.distinct(case((is_new, Quiz.subject_id)))),
+        students,
+    ).select_from(Quiz)
+    if teacher_id:
+        query = query.filter(Quiz.teacher_id == teacher_id)
+    total_quizzes, new_quizzes, total_subjects, new_subjects, total_students = query.one()
+    return {
+        'total_quizzes': int(total_quizzes or 0),
+        'new_quizzes': int(new_quizzes or 0),
+        'total_subjects': int(total_subjects or 0),
+        'new_subjects': int(new_subjects or 0),
+        'total_students': int(total_students or 0),
+        # Student has no created_at column
+        'new_students': 0,
+    }
+
+
+class DashboardCache:
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # teacher_id (None = all quizzes) -> (expires_at, counts)
+        self._lock = threading.Lock()
+
+    def get(self, teacher_id):
+        """(counts, hit): cached counters for `teacher_id`, computed on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(teacher_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1], True
+            self.misses += 1
+        counts = dashboard_counts(teacher_id)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[teacher_id] = (now + self.ttl, counts)
+        return counts, False
+
+    def invalidate(self, teacher_id=None):
+        """Drop the entry of `teacher_id` and the all-quizzes entry."""
+        with self._lock:
+            self._entries.pop(teacher_id, None)
+            self._entries.pop(None, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dashboard_cache = DashboardCache()
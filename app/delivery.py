@@ -0,0 +1,142 @@
+"""Precomputed quiz delivery payloads.
+
+Opening a quiz used to render ``take_quiz.html`` from ``quiz.questions`` and each
+question's lazily loaded ``options``: 1 + Q + Q queries per student per view. The
+student-facing content of a quiz (questions and options, never the answers) is now
+serialized once when the quiz is created, edited or imported and stored in
+QuizDelivery together with a digest of it, the ETag.
+
+Serving a quiz is then one primary-key lookup of that ETag. Each worker keeps the
+parsed payload and the rendered page for the current ETag in a small LRU, so a
+class opening the same quiz renders it once, and a browser that already holds the
+page gets a 304.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from .models import db, Quiz, Question, Option, Subject, QuizDelivery
+
+
+def build_payloads(quiz_ids):
+    """Student-facing payloads {quiz_id: dict} for the given quizzes, in three queries."""
+    ids = sorted({int(i) for i in quiz_ids})
+    if not ids:
+        return {}
+    payloads = {}
+    rows = (
+        db.session.query(Quiz.id, Quiz.version, Quiz.title, Quiz.description, Quiz.time_limit, Quiz.difficulty, Subject.name)
+        .outerjoin(Subject, Subject.id == Quiz.subject_id)
+        .filter(Quiz.id.in_(ids))
+    )
+    for quiz_id, version, title, description, time_limit, difficulty, subject in rows:
+        payloads[quiz_id] = {
+            'id': quiz_id,
+            'version': version or 1,
+            'title': title,
+            'description': description,
+            'time_limit': time_limit,
+            'difficulty': difficulty,
+            'subject': subject,
+            'questions': [],
+        }
+    questions = {}
+    for qid, quiz_id, qtype, text in (
+        db.session.query(Question.id, Question.quiz_id, Question.type, Question.text)
+        .filter(Question.quiz_id.in_(list(payloads)))
+        .order_by(Question.id)
+    ):
+        questions[qid] = {'id': qid, 'type': qtype, 'text': text, 'options': []}
+        payloads[quiz_id]['questions'].append(questions[qid])
+    if questions:
+        for question_id, key, text in (
+            db.session.query(Option.question_id, Option.key, Option.text)
+            .filter(Option.question_id.in_(list(questions)))
+            .order_by(Option.id)
+        ):
+            questions[question_id]['options'].append({'key': key, 'text': text})
+    return payloads
+
+
+def serialize(payload):
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return body, hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+
+
+def publish(quiz_ids):
+    """Rebuild and store the delivery payloads of `quiz_ids`; caller commits."""
+    payloads = build_payloads(quiz_ids)
+    if not payloads:
+        return
+    QuizDelivery.query.filter(QuizDelivery.quiz_id.in_(list(payloads))).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    rows = []
+    for quiz_id, payload in payloads.items():
+        body, etag = serialize(payload)
+        rows.append(QuizDelivery(quiz_id=quiz_id, version=payload['version'], etag=etag, payload=body, built_at=now))
+    db.session.add_all(rows)
+
+
+def withdraw(quiz_id):
+    """Drop the delivery payload of a quiz that is being deleted; caller commits."""
+    QuizDelivery.query.filter(QuizDelivery.quiz_id == quiz_id).delete(synchronize_session=False)
+    delivery_cache.invalidate(quiz_id)
+
+
+class DeliveryCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # quiz_id -> {'etag', 'body', 'payload', 'page', 'page_etag'}
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id, etag):
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            if entry is None or entry['etag'] != etag:
+                return None
+            self._entries.move_to_end(quiz_id)
+            return entry
+
+    def put(self, quiz_id, entry):
+        with self._lock:
+            self._entries[quiz_id] = entry
+            self._entries.move_to_end(quiz_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, quiz_id):
+        with self._lock:
+            self._entries.pop(quiz_id, None)
+
+
+delivery_cache = DeliveryCache()
+
+
+def get_delivery(quiz_id):
+    """(entry, hit) for the current delivery payload of a quiz, or (None, False).
+
+    entry holds 'etag', 'body' (the JSON text) and 'payload' (parsed); the route may
+    add a rendered 'page' to it. Quizzes without a stored payload (created before
+    payloads existed) get one built here.
+    """
+    etag = db.session.query(QuizDelivery.etag).filter(QuizDelivery.quiz_id == quiz_id).scalar()
+    if etag is not None:
+        entry = delivery_cache.get(quiz_id, etag)
+        if entry is not None:
+            return entry, True
+        row = db.session.query(QuizDelivery.etag, QuizDelivery.payload).filter(QuizDelivery.quiz_id == quiz_id).first()
+    else:
+        try:
+            publish([quiz_id])
+            db.session.commit()
+        except Exception:
+            # another worker published it at the same time
+            db.session.rollback()
+        row = db.session.query(QuizDelivery.etag, QuizDelivery.payload).filter(QuizDelivery.quiz_id == quiz_id).first()
+    if row is None:
+        return None, False
+    entry = {'etag': row.etag, 'body': row.payload, 'payload': json.loads(row.payload)}
+    delivery_cache.put(quiz_id, entry)
+    return entry, False
@@ -0,0 +1,222 @@
+"""Background export jobs for the CPU-heavy formats (PDF and Word).
+
+The request gathers the rows to export (one cheap query) and submits them as a job;
+a process pool renders the file off the request worker and writes it to the export
+cache under ``<instance>/exports``. Jobs are keyed by a digest of the exported data,
+so the key changes whenever the data does and a repeat download of unchanged data is
+served straight from disk without rendering anything.
+
+All job state lives in the cache directory (``<id>.json`` metadata, the artifact,
+``<id>.error`` on failure), so any gunicorn worker can answer status and download
+requests for a job started by another one.
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+# -- renderers (run in the pool processes; no database access) ---------------
+
+def render_roster_pdf(path, rows):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    c = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+    x = 40
+    y = height - 40
+    c.setFont('Helvetica-Bold', 14)
+    c.drawString(x, y, 'Students')
+    y -= 24
+    c.setFont('Helvetica', 10)
+    c.drawString(x, y, 'Name')
+    c.drawString(x+220, y, 'Email')
+    c.drawString(x+420, y, 'Taken')
+    c.drawString(x+480, y, 'Avg')
+    y -= 14
+    c.line(x, y, width-40, y)
+    y -= 14
+    for name, email, total_taken, avg_percent in rows:
+        if y < 60:
+            c.showPage()
+            y = height - 40
+        avg = '' if avg_percent is None else f"{avg_percent}%"
+        c.drawString(x, y, str(name or ''))
+        c.drawString(x+220, y, str(email or ''))
+        c.drawString(x+420, y, str(total_taken or ''))
+        c.drawString(x+480, y, avg)
+        y -= 16
+    c.save()
+
+
+ATTEMPT_HEADERS = ['Title', 'Subject', 'Completed At', 'Score', 'Percent', 'Time']
+
+
+def render_attempts_docx(path, rows, student_name):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(f"Quiz Attempts - {student_name}", level=1)
+    table = doc.add_table(rows=1, cols=len(ATTEMPT_HEADERS))
+    hdr_cells = table.rows[0].cells
+    for i, label in enumerate(ATTEMPT_HEADERS):
+        hdr_cells[i].text = label
+    for r in rows:
+        row_cells = table.add_row().cells
+        for i, val in enumerate(r):
+            row_cells[i].text = str(val or '')
+    doc.save(path)
+
+
+def render_attempts_doc(path, rows, student_name):
+    # simple HTML document with .doc extension — Word can open this
+    html = ['<html><head><meta charset="utf-8" /><title>Quiz Attempts</title></head><body>']
+    html.append(f'<h1>Quiz Attempts - {student_name}</h1>')
+    html.append('<table border="1" cellspacing="0" cellpadding="4">')
+    html.append('<tr>' + ''.join(f'<th>{h}</th>' for h in ATTEMPT_HEADERS) + '</tr>')
+    for r in rows:
+        html.append('<tr>' + ''.join(f'<td>{(x or "")}</td>' for x in r) + '</tr>')
+    html.append('</table></body></html>')
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write('\n'.join(html))
+
+
+RENDERERS = {
+    'roster_pdf': render_roster_pdf,
+    'attempts_docx': render_attempts_docx,
+    'attempts_doc': render_attempts_doc,
+}
+
+
+def _render(kind, path, args):
+    # write under a temporary name so a half-written file is never served
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        RENDERERS[kind](tmp, *args)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# -- job bookkeeping (request workers) -----------------------------------------
+
+class ExportJobs:
+    def __init__(self):
+        self.directory = None
+        self.background = True
+        self.max_workers = 2
+        self.max_age = 7 * 24 * 3600
+        self.job_timeout = 300
+        self._secret = b''
+        self._pool = None
+        self._pid = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.directory = app.config.get("EXPORT_CACHE_DIR") or os.path.join(app.instance_path, "exports")
+        self.background = bool(app.config.get("EXPORT_BACKGROUND", True))
+        self.max_workers = int(app.config.get("EXPORT_WORKERS", 2))
+        self.max_age = int(app.config.get("EXPORT_CACHE_SECONDS", self.max_age))
+        self.job_timeout = int(app.config.get("EXPORT_JOB_TIMEOUT", self.job_timeout))
+        self._secret = str(app.config.get("SECRET_KEY") or "").encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _executor(self):
+        # one pool per worker process; a pool inherited through fork is unusable
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._futures = {}
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def job_id(self, kind, args):
+        # the data version: a keyed digest of everything the file is rendered from
+        payload = json.dumps([kind, args], default=str, separators=(",", ":"))
+        return hmac.new(self._secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def submit(self, kind, args, filename, mimetype):
+        """Start rendering `kind` from `args` unless it is cached or running; returns the job id."""
+        job_id = self.job_id(kind, args)
+        meta_path = self._path(job_id, ".json")
+        if os.path.exists(self._path(job_id, ".out")):
+            return job_id
+        if self.status(job_id) == "pending":
+            return job_id
+
+        self._prune()
+        if os.path.exists(self._path(job_id, ".error")):
+            os.remove(self._path(job_id, ".error"))
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump({"kind": kind, "filename": filename, "mimetype": mimetype, "created": time.time()}, fh)
+
+        if not self.background:
+            try:
+                _render(kind, self._path(job_id, ".out"), args)
+            except Exception as exc:
+                self._fail(job_id, exc)
+            return job_id
+
+        future = self._executor().submit(_render, kind, self._path(job_id, ".out"), args)
+        self._futures[job_id] = future
+
+        def done(f, job_id=job_id):
+            self._futures.pop(job_id, None)
+            if f.exception() is not None:
+                self._fail(job_id, f.exception())
+
+        future.add_done_callback(done)
+        return job_id
+
+    def _fail(self, job_id, exc):
+        with open(self._path(job_id, ".error"), "w", encoding="utf-8") as fh:
+            fh.write(f"{type(exc).__name__}: {exc}")
+
+    def status(self, job_id):
+        """'ready', 'pending', 'failed' or None for an unknown job."""
+        meta_path = self._path(job_id, ".json")
+        if not os.path.exists(meta_path):
+            return None
+        if os.path.exists(self._path(job_id, ".out")):
+            return "ready"
+        if os.path.exists(self._path(job_id, ".error")):
+            return "failed"
+        if job_id in self._futures:
+            return "pending"
+        # started by another worker: give up on it once it is clearly dead
+        if time.time() - os.path.getmtime(meta_path) > self.job_timeout:
+            return "failed"
+        return "pending"
+
+    def artifact(self, job_id):
+        """(path, metadata) of a finished job, or None."""
+        if self.status(job_id) != "ready":
+            return None
+        with open(self._path(job_id, ".json"), encoding="utf-8") as fh:
+            return self._path(job_id, ".out"), json.load(fh)
+
+    def _prune(self):
+        cutoff = time.time() - self.max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+def valid_job_id(job_id):
+    return len(job_id) == 64 and all(c in "0123456789abcdef" for c in job_id)
+
+
+export_jobs = ExportJobs()
@@ -0,0 +1,97 @@
+"""Streaming exports.
+
+The roster export used to build every row into a list of dicts, then a StringIO, then
+a BytesIO before sending it, so a district-wide roster sat in worker memory several
+times over. Here rows are read from a server-side cursor (``yield_per`` with
+``stream_results``) and encoded into a generator of small chunks, so memory stays flat
+no matter how many students there are.
+"""
+import csv
+import io
+
+from sqlalchemy import func
+
+from .models import db, Student, QuizAttempt
+
+# rows fetched from the cursor per round trip
+FETCH_SIZE = 500
+# rows encoded per chunk handed to the WSGI server
+CHUNK_ROWS = 200
+
+
+def roster_rows():
+    """Yield one dict per student: id, name, email, total_taken, avg_percent."""
+    query = (
+        db.session.query(
+            Student.id.label('id'),
+            Student.name.label('name'),
+            Student.email.label('email'),
+            func.count(QuizAttempt.id).label('total_taken'),
+            func.avg(QuizAttempt.percent).label('avg_percent')
+        )
+        .outerjoin(QuizAttempt, QuizAttempt.student_id == Student.id)
+        .group_by(Student.id)
+        .order_by(Student.name.asc())
+        .execution_options(stream_results=True, yield_per=FETCH_SIZE)
+    )
+    for r in query:
+        avg = None
+        try:
+            if r.avg_percent is not None:
+                avg = round(float(r.avg_percent), 1)
+        except Exception:
+            avg = None
+        yield {
+            'id': r.id,
+            'name': r.name,
+            'email': r.email,
+            'total_taken': int(r.total_taken or 0),
+            'avg_percent': avg,
+        }
+
+
+def _chunked(rows, write_row, header, prefix=''):
+    # encode CHUNK_ROWS rows at a time into one reusable buffer
+    out = io.StringIO()
+    out.write(prefix)
+    write_row(out, header)
+    count = 0
+    for row in rows:
+        write_row(out, row)
+        count += 1
+        if count >= CHUNK_ROWS:
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+            count = 0
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
+
+
+def roster_csv(rows):
+    """CSV chunks (Excel-friendly: UTF-8 with BOM)."""
+    writer = None
+
+    def write_row(out, values):
+        nonlocal writer
+        if writer is None:
+            writer = csv.writer(out)
+        writer.writerow(values)
+
+    records = (
+        [s['name'], s['email'], s['total_taken'], '' if s['avg_percent'] is None else str(s['avg_percent'])]
+        for s in rows
+    )
+    return _chunked(records, write_row, ['Name', 'Email', 'Quizzes Taken', 'Avg Score'], prefix='\ufeff')
+
+
+def roster_txt(rows):
+    """Tab separated text chunks."""
+    def write_row(out, values):
+        out.write('\t'.join(str(v) for v in values) + '\n')
+
+    records = (
+        [s['name'], s['email'], s['total_taken'], '' if s['avg_percent'] is None else f"{s['avg_percent']}%"]
+        for s in rows
+    )
+    return _chunked(records, write_row, ['Name', 'Email', 'Quizzes Taken', 'Avg Score'])
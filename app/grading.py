@@ -0,0 +1,94 @@
+"""Quiz grading with a per-worker cache of compiled answer keys.
+
+Grading used to reload the quiz and lazily walk ``quiz.questions`` on every
+submission. An answer key is compiled once per (quiz id, content version) and kept in
+a small LRU cache; ``Quiz.version`` is bumped whenever a teacher edits the quiz, so a
+stale key is simply never looked up again.
+"""
+import threading
+from collections import OrderedDict
+
+from .models import db, Question
+
+
+class AnswerKeyCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id, version):
+        with self._lock:
+            key = self._keys.get((quiz_id, version))
+            if key is not None:
+                self._keys.move_to_end((quiz_id, version))
+            return key
+
+    def put(self, quiz_id, version, answer_key):
+        with self._lock:
+            self._keys[(quiz_id, version)] = answer_key
+            self._keys.move_to_end((quiz_id, version))
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def invalidate(self, quiz_id):
+        """Drop every cached version of a quiz (e.g. after it is deleted)."""
+        with self._lock:
+            for cache_key in [k for k in self._keys if k[0] == quiz_id]:
+                del self._keys[cache_key]
+
+
+answer_keys = AnswerKeyCache()
+
+
+def compile_answer_key(quiz_id):
+    """Load a quiz's questions once and return a tuple of (id, type, correct, raw)."""
+    rows = (
+        db.session.query(Question.id, Question.type, Question.correct_answer)
+        .filter(Question.quiz_id == quiz_id)
+        .order_by(Question.id)
+        .all()
+    )
+    compiled = []
+    for qid, qtype, correct in rows:
+        # True/False keys are compared verbatim, MC keys ignore surrounding whitespace
+        normalized = correct if qtype == 'tf' else str(correct).strip()
+        compiled.append((qid, qtype, normalized, correct))
+    return tuple(compiled)
+
+
+def get_answer_key(quiz_id, version):
+    key = answer_keys.get(quiz_id, version)
+    if key is None:
+        key = compile_answer_key(quiz_id)
+        answer_keys.put(quiz_id, version, key)
+    return key
+
+
+def grade(answer_key, answers):
+    """Grade a submission against a compiled key; returns (correct_count, details)."""
+    correct_count = 0
+    details = []
+    for qid, qtype, normalized, correct in answer_key:
+        given = answers.get(str(qid))
+        is_correct = False
+        if qtype == 'tf':
+            # Accept boolean or string
+            if isinstance(given, bool):
+                given_norm = 'True' if given else 'False'
+            else:
+                given_norm = str(given)
+            is_correct = given_norm == normalized
+        elif given is not None:
+            # mc: compare string keys (A/B/C...)
+            is_correct = str(given).strip() == normalized
+
+        if is_correct:
+            correct_count += 1
+        details.append({
+            "question_id": qid,
+            "given": given,
+            "correct_answer": correct,
+            "is_correct": is_correct,
+        })
+    return correct_count, details
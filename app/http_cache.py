@@ -0,0 +1,98 @@
+"""Conditional GET for read-mostly pages and JSON endpoints.
+
+`validated(stamp)` wraps a view so its response carries a strong ETag and a private
+caching policy. The ETag is derived before the view runs, from a cheap data-version
+stamp returned by ``stamp(**view_args)`` plus the request (endpoint, arguments,
+query string), the logged-in user and the deployed templates and assets. A
+request whose If-None-Match already holds it gets a 304 without running a query
+for the page or rendering a template.
+
+Stamps come from DataVersion counters, which the write paths bump in their own
+transaction (`bump('catalog')`), or from other monotonic ids such as the
+conversation's latest MessageEvent.
+"""
+import functools
+import hashlib
+import json
+import os
+
+from flask import request, session, make_response, current_app
+
+from .models import db, DataVersion
+from .stats import increment
+
+# quizzes, subjects and the teacher names shown next to them
+CATALOG = 'catalog'
+# student accounts; bumped when one is deleted (reloads the leaderboard)
+STUDENTS = 'students'
+
+
+def bump(*names):
+    """Advance the version counters `names` (caller commits)."""
+    for name in names:
+        increment(DataVersion, {'name': name}, {'version': 1})
+
+
+def data_version(name):
+    return db.session.query(DataVersion.version).filter(DataVersion.name == name).scalar() or 0
+
+
+def catalog_version(**view_args):
+    return data_version(CATALOG)
+
+
+def templates_revision(app):
+    """Latest modification time of the templates and the built static assets: a new
+    deploy (or a rebuilt, re-fingerprinted image) changes every ETag."""
+    latest = 0
+    for root, _, files in os.walk(os.path.join(app.root_path, 'templates')):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    manifest = os.path.join(app.static_folder, 'build', 'manifest.json')
+    if os.path.exists(manifest):
+        latest = max(latest, os.path.getmtime(manifest))
+    return str(int(latest))
+
+
+def validated(stamp, cache_control='private, no-cache'):
+    """Decorate a GET view with an ETag computed from ``stamp(**view_args)``.
+
+    `stamp` returning None disables validation for that request. The default policy
+    lets the browser keep the response but revalidate it on every use.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('HTTP_CACHE', True):
+                return view(*args, **kwargs)
+            try:
+                version = stamp(**kwargs)
+            except Exception:
+                db.session.rollback()
+                version = None
+            if version is None:
+                return view(*args, **kwargs)
+            key = json.dumps([
+                request.endpoint, kwargs, request.query_string.decode('latin-1'),
+                session.get('teacher_id'), session.get('student_id'),
+                version, current_app.config.get('HTTP_CACHE_REVISION'),
+            ], default=str, sort_keys=True)
+            etag = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    if not app.config.get('HTTP_CACHE_REVISION'):
+        app.config['HTTP_CACHE_REVISION'] = templates_revision(app)
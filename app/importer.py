@@ -0,0 +1,409 @@
+"""Bulk import of question banks.
+
+A question bank is a CSV file, a JSON-lines file or a DOCX document holding any
+number of quizzes. Every record is one question tagged with its quiz (CSV rows,
+DOCX table rows, JSON lines), or a JSON line can hold a whole quiz with a
+``questions`` list. Quiz-level fields (subject, difficulty, time_limit,
+description) are taken from the first record of each quiz title.
+
+Records are read and validated one at a time; invalid records are reported with
+their line and skipped, the rest are inserted in batches of `batch_size`
+questions, one flush and commit per batch. A batch the database rejects is saved
+again row by row, one savepoint each, and only the rows it still rejects are
+reported. Lines that are not valid UTF-8 are reported like invalid records; a file
+that cannot be read to the end keeps the batches saved so far. The imported
+quizzes are added to the search index and get their delivery payloads once at
+the end.
+
+CSV / DOCX table columns:
+    quiz_title, subject, difficulty, time_limit, description,
+    type (mc|tf), text, correct, option_a, option_b, option_c, option_d
+"""
+import codecs
+import csv
+import json
+import os
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from .models import db, Subject, Quiz, Question, Option, Teacher
+from .catalog import DIFFICULTIES
+from .search import search_index
+from .delivery import publish
+from .http_cache import bump, CATALOG
+
+FORMATS = ('csv', 'jsonl', 'docx')
+OPTION_KEYS = ('A', 'B', 'C', 'D')
+# errors kept in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 200
+
+# accepted spellings of the column names
+ALIASES = {
+    'quiz': 'quiz_title', 'title': 'quiz_title', 'quiz title': 'quiz_title',
+    'question': 'text', 'question_text': 'text',
+    'answer': 'correct', 'correct_answer': 'correct',
+    'time limit': 'time_limit',
+    'a': 'option_a', 'b': 'option_b', 'c': 'option_c', 'd': 'option_d',
+}
+TYPES = {
+    'mc': 'mc', 'multiple choice': 'mc', 'multiple_choice': 'mc',
+    'tf': 'tf', 'true/false': 'tf', 'true_false': 'tf', 'truefalse': 'tf',
+}
+
+
+def guess_format(filename):
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if ext in ('json', 'ndjson'):
+        return 'jsonl'
+    return ext if ext in FORMATS else None
+
+
+def _normalize(raw):
+    record = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = str(key).strip().lower()
+        record[ALIASES.get(key, key)] = value.strip() if isinstance(value, str) else value
+    return record
+
+
+# -- readers: yield (location, raw record or exception) ----------------------
+
+def _lines(stream, bad):
+    """Decode the binary `stream` line by line as UTF-8. Undecodable lines are
+    yielded with replacement characters (so line numbers stay right) and their
+    numbers added to `bad`."""
+    for n, line in enumerate(stream, start=1):
+        if n == 1 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            bad.add(n)
+            yield line.decode('utf-8', errors='replace')
+
+
+def read_csv(stream):
+    bad = set()
+    reader = csv.DictReader(_lines(stream, bad))
+    reader.fieldnames  # reads the header row
+    last = reader.line_num
+    for row in reader:
+        # a quoted field can span lines: the row is lines last+1 .. line_num
+        if bad.intersection(range(last + 1, reader.line_num + 1)):
+            yield str(reader.line_num), ValueError('not valid UTF-8 text')
+        else:
+            yield str(reader.line_num), row
+        last = reader.line_num
+
+
+def read_jsonl(stream):
+    bad = set()
+    for n, line in enumerate(_lines(stream, bad), start=1):
+        if n in bad:
+            yield str(n), ValueError('not valid UTF-8 text')
+            continue
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield str(n), ValueError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(obj, dict):
+            yield str(n), ValueError('expected a JSON object')
+            continue
+        questions = obj.pop('questions', None)
+        if questions is None:
+            yield str(n), obj
+            continue
+        if not isinstance(questions, list) or not questions:
+            yield str(n), ValueError('quiz has no questions')
+            continue
+        # a whole quiz on one line: every question inherits the quiz fields
+        for i, q in enumerate(questions, start=1):
+            yield f'{n}.{i}', dict(obj, **q) if isinstance(q, dict) else ValueError('expected a question object')
+
+
+def read_docx(stream):
+    from docx import Document
+
+    document = Document(stream)
+    for t, table in enumerate(document.tables, start=1):
+        rows = table.rows
+        if not rows:
+            continue
+        header = [c.text.strip().lower() for c in rows[0].cells]
+        header = [ALIASES.get(h, h) for h in header]
+        # only tables laid out as a question bank
+        if 'text' not in header:
+            continue
+        for r in range(1, len(rows)):
+            yield f'table {t} row {r + 1}', dict(zip(header, (c.text for c in rows[r].cells)))
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'docx': read_docx}
+
+
+# -- validation ----------------------------------------------------------------
+
+def _options(record):
+    options = record.get('options')
+    if isinstance(options, list):
+        parsed = []
+        for i, opt in enumerate(options):
+            if isinstance(opt, dict):
+                key, text = opt.get('key') or (OPTION_KEYS[i] if i < len(OPTION_KEYS) else None), opt.get('text')
+            else:
+                key, text = (OPTION_KEYS[i] if i < len(OPTION_KEYS) else None), opt
+            if key is None:
+                raise ValueError('at most %d options' % len(OPTION_KEYS))
+            if text is not None and str(text).strip():
+                parsed.append((str(key).strip().upper(), str(text).strip()))
+        return parsed
+    return [(key, str(record['option_' + key.lower()]).strip()) for key in OPTION_KEYS
+            if record.get('option_' + key.lower()) not in (None, '')]
+
+
+def validate(record):
+    """Normalize one raw record to (quiz fields, question fields); raises ValueError."""
+    record = _normalize(record)
+    title = str(record.get('quiz_title') or '').strip()
+    if not title:
+        raise ValueError('missing quiz_title')
+    if len(title) > 200:
+        raise ValueError('quiz_title longer than 200 characters')
+    text = str(record.get('text') or '').strip()
+    if not text:
+        raise ValueError('missing question text')
+    correct = str(record.get('correct') if record.get('correct') is not None else '').strip()
+    if not correct:
+        raise ValueError('missing correct answer')
+
+    options = _options(record)
+    qtype = TYPES.get(str(record.get('type') or '').strip().lower())
+    if not record.get('type'):
+        qtype = 'tf' if not options and correct.lower() in ('true', 'false') else 'mc'
+    elif qtype is None:
+        raise ValueError(f"unknown question type {record.get('type')!r}")
+    if qtype == 'tf':
+        if correct.lower() not in ('true', 'false', 't', 'f'):
+            raise ValueError('true/false answer must be True or False')
+        correct, options = ('True' if correct.lower() in ('true', 't') else 'False'), []
+    else:
+        if len(options) < 2:
+            raise ValueError('multiple choice question needs at least two options')
+        correct = correct.upper()
+        if correct not in {key for key, _ in options}:
+            raise ValueError(f'correct answer {correct!r} is not one of the options')
+
+    time_limit = record.get('time_limit')
+    try:
+        time_limit = int(time_limit) if time_limit not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('time_limit must be a whole number of minutes')
+    if time_limit is not None and time_limit < 0:
+        raise ValueError('time_limit must not be negative')
+    difficulty = str(record.get('difficulty') or '').strip().capitalize() or None
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ValueError('difficulty must be one of ' + ', '.join(DIFFICULTIES))
+
+    quiz = {
+        'title': title,
+        'subject': str(record.get('subject') or '').strip() or None,
+        'difficulty': difficulty,
+        'time_limit': time_limit,
+        'description': str(record.get('description') or '').strip() or None,
+    }
+    return quiz, {'type': qtype, 'text': text, 'correct_answer': correct, 'options': options}
+
+
+# -- loading -------------------------------------------------------------------
+
+class ImportReport:
+    def __init__(self):
+        self.quizzes = 0
+        self.questions = 0
+        self.error_count = 0
+        self.errors = []
+        self.quiz_ids = []
+
+    def error(self, location, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': location, 'error': message})
+
+    def to_dict(self):
+        return {
+            'quizzes': self.quizzes,
+            'questions': self.questions,
+            'quiz_ids': self.quiz_ids,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def import_bank(stream, fmt, teacher_id, batch_size=500):
+    """Import a question bank read from the binary `stream`; returns an ImportReport."""
+    report = ImportReport()
+    quiz_ids = {}      # title -> id of the quiz created by this import
+    quiz_fields = {}   # title -> quiz fields of its first record, until the quiz is created
+    subject_ids = {}   # name -> id
+    batch = []         # (location, title, question fields)
+
+    def subject_id(name):
+        if not name:
+            return None
+        if name not in subject_ids:
+            subject = Subject.query.filter_by(name=name).first()
+            if subject is None:
+                subject = Subject(name=name)
+                db.session.add(subject)
+                db.session.flush()
+            subject_ids[name] = subject.id
+        return subject_ids[name]
+
+    def add_row(title, fields, new_quizzes):
+        if title not in quiz_ids and title not in new_quizzes:
+            f = quiz_fields[title]
+            new_quizzes[title] = Quiz(
+                title=title, description=f['description'], time_limit=f['time_limit'] or 0,
+                difficulty=f['difficulty'], subject_id=subject_id(f['subject']), teacher_id=teacher_id,
+            )
+            db.session.add(new_quizzes[title])
+        question = Question(
+            type=fields['type'], text=fields['text'], correct_answer=fields['correct_answer'],
+            options=[Option(key=key, text=text) for key, text in fields['options']],
+        )
+        if title in new_quizzes:
+            question.quiz = new_quizzes[title]
+        else:
+            question.quiz_id = quiz_ids[title]
+        db.session.add(question)
+
+    def commit(rows, new_quizzes):
+        """Commit the added rows; returns the error or None."""
+        # quizzes of earlier batches that get more questions change content
+        grown = {quiz_ids[title] for _, title, _ in rows if title in quiz_ids}
+        try:
+            if grown:
+                Quiz.query.filter(Quiz.id.in_(grown)).update(
+                    {Quiz.version: func.coalesce(Quiz.version, 1) + 1}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # subjects created in the failed batch are gone too
+            subject_ids.clear()
+            return e
+        for title, quiz in new_quizzes.items():
+            quiz_ids[title] = quiz.id
+            report.quiz_ids.append(quiz.id)
+        report.quizzes += len(new_quizzes)
+        report.questions += len(rows)
+        return None
+
+    def flush_rows():
+        # the database rejected the batch: save it row by row, one savepoint each,
+        # so only the rows it rejects are lost
+        new_quizzes = {}
+        rows = []
+        for location, title, fields in batch:
+            subjects = dict(subject_ids)
+            row_quizzes = dict(new_quizzes)
+            try:
+                with db.session.begin_nested():
+                    add_row(title, fields, row_quizzes)
+            except Exception as e:
+                # forget the subjects created in the rolled back savepoint
+                subject_ids.clear()
+                subject_ids.update(subjects)
+                report.error(location, f'not saved: {e}')
+            else:
+                new_quizzes = row_quizzes
+                rows.append((location, title, fields))
+        error = commit(rows, new_quizzes)
+        if error is not None:
+            for location, _, _ in rows:
+                report.error(location, f'not saved: {error}')
+
+    def flush_batch():
+        new_quizzes = {}
+        try:
+            for _, title, fields in batch:
+                add_row(title, fields, new_quizzes)
+        except Exception as e:
+            db.session.rollback()
+            subject_ids.clear()
+            error = e
+        else:
+            error = commit(batch, new_quizzes)
+        if error is not None:
+            flush_rows()
+        batch.clear()
+
+    try:
+        for location, raw in READERS[fmt](stream):
+            if isinstance(raw, Exception):
+                report.error(location, str(raw))
+                continue
+            try:
+                quiz, fields = validate(raw)
+            except ValueError as e:
+                report.error(location, str(e))
+                continue
+            quiz_fields.setdefault(quiz['title'], quiz)
+            batch.append((location, quiz['title'], fields))
+            if len(batch) >= batch_size:
+                flush_batch()
+    except Exception as e:
+        # unreadable file (e.g. a corrupt DOCX): the batches saved so far are kept
+        # and finished below like a complete import
+        report.error('file', f'could not read the file: {e}')
+    if batch:
+        flush_batch()
+    if report.quiz_ids:
+        bump(CATALOG)
+        db.session.commit()
+        try:
+            search_index.index(report.quiz_ids)
+            db.session.commit()
+        except Exception:
+            # the quizzes are saved; `flask rebuild-search-index` catches up
+            db.session.rollback()
+        try:
+            publish(report.quiz_ids)
+            db.session.commit()
+        except Exception:
+            # payloads missing here are built when the quiz is first opened
+            db.session.rollback()
+    return report
+
+
+@click.command('import-quizzes')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--teacher', 'teacher_email', required=True, help='email of the teacher who will own the quizzes')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='file format (default: from the extension)')
+@click.option('--batch-size', default=500, show_default=True, help='questions inserted per transaction')
+@with_appcontext
+def import_quizzes_command(path, teacher_email, fmt, batch_size):
+    """Import quizzes from a CSV, JSON-lines or DOCX question bank."""
+    fmt = fmt or guess_format(path)
+    if fmt is None:
+        raise click.UsageError('cannot tell the format from the file name, pass --format')
+    teacher = Teacher.query.filter_by(email=teacher_email).first()
+    if teacher is None:
+        raise click.UsageError(f'no teacher with email {teacher_email}')
+    with open(path, 'rb') as fh:
+        report = import_bank(fh, fmt, teacher.id, batch_size=batch_size)
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    if report.error_count > len(report.errors):
+        click.echo(f'... and {report.error_count - len(report.errors)} more errors', err=True)
+    click.echo(f'Imported {report.quizzes} quizzes with {report.questions} questions ({report.error_count} rows rejected).')
+
+
+def init_app(app):
+    app.cli.add_command(import_quizzes_command)
@@ -0,0 +1,65 @@
+"""Messaging inbox built from a single aggregated query.
+
+The inbox views used to lazy-load every message of every conversation just to read
+the last one, plus one COUNT query per conversation for the unread badge. Here one
+grouped subquery yields, per conversation, the id of the last message and the number
+of unread messages from the other party; the conversation, the other participant and
+the last message are joined onto it, and pages are ordered by last activity.
+"""
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import aliased
+
+from .models import db, Conversation, Message, Student, Teacher
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def inbox_query(role, owner_id):
+    """Return (query, other_key): conversations of the owner with the other
+    participant, the last message and the unread count, newest activity first."""
+    if role == 'teacher':
+        owner_col, other_role, other_model, other_col, other_key = Conversation.teacher_id, 'student', Student, Conversation.student_id, 'student'
+    else:
+        owner_col, other_role, other_model, other_col, other_key = Conversation.student_id, 'teacher', Teacher, Conversation.teacher_id, 'teacher'
+
+    summary = (
+        db.session.query(
+            Message.conversation_id.label('conversation_id'),
+            func.max(Message.id).label('last_id'),
+            func.count(case((and_(Message.sender_role == other_role, Message.read == False), 1))).label('unread'),
+        )
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(owner_col == owner_id)
+        .group_by(Message.conversation_id)
+        .subquery()
+    )
+    last = aliased(Message)
+    participant = aliased(other_model)
+    last_activity = func.coalesce(last.created_at, Conversation.created_at)
+
+    query = (
+        db.session.query(Conversation, participant, last, summary.c.unread)
+        .outerjoin(summary, summary.c.conversation_id == Conversation.id)
+        .outerjoin(last, last.id == summary.c.last_id)
+        .outerjoin(participant, participant.id == other_col)
+        .filter(owner_col == owner_id)
+        .order_by(last_activity.desc(), Conversation.id.desc())
+    )
+    return query, other_key
+
+
+def inbox_page(role, owner_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """Return (conversations, has_more) for a teacher's or student's inbox.
+
+    Each conversation is a dict with ``id``, the other participant under
+    ``'student'`` or ``'teacher'``, ``last`` (the last Message or None) and
+    ``unread`` (messages from the other party not yet read).
+    """
+    query, other_key = inbox_query(role, owner_id)
+    page = max(1, int(page or 1))
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    conversations = []
+    for conv, other, last_message, unread in rows[:per_page]:
+        conversations.append({'id': conv.id, other_key: other, 'last': last_message, 'unread': int(unread or 0)})
+    return conversations, has_more
@@ -0,0 +1,310 @@
+"""Write-behind submission queue backed by a durable local journal.
+
+When ``SUBMISSION_WRITE_BEHIND`` is enabled, a graded attempt is appended (and
+fsynced) to a per-process journal segment and acknowledged right away. A background
+thread drains the queue into QuizAttempt/AttemptAnswer in batched transactions, so a
+class-wide submit spike becomes a handful of short write transactions instead of
+hundreds of writers fighting over SQLite's lock.
+
+Every entry carries a ticket that is stored in SubmissionReceipt in the same
+transaction as the attempt. Replaying a journal after a crash therefore skips entries
+that already reached the database, and segments left behind by dead processes are
+replayed at startup. Readers of a student's own stats call ``settle(student_id)``
+first, which waits until this worker has written that student's pending entries.
+
+While the database is unavailable or locked (OperationalError) the batch stays queued
+and is retried with a growing back-off; the segment is only truncated once the queue
+is empty. Only entries the database rejects (e.g. a quiz deleted meanwhile) are set
+aside in ``failed.jsonl``, which is retried at the next startup.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, orphan detection is best-effort
+    fcntl = None
+
+from sqlalchemy.exc import OperationalError
+
+from .models import db, SubmissionReceipt
+from .submissions import save_attempt
+
+
+def _lock(fh, blocking=True):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        return True
+    except OSError:
+        return False
+
+
+def _transient(error):
+    """True for errors worth retrying: database locked, connection lost, ..."""
+    return isinstance(error, OperationalError) or getattr(error, 'connection_invalidated', False)
+
+
+class SubmissionJournal:
+    FAILED = "failed.jsonl"
+    # seconds between retries while the database is unavailable
+    RETRY_MIN = 0.5
+    RETRY_MAX = 30.0
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.directory = None
+        self.batch_size = 200
+        self.flush_interval = 0.05
+        self.receipt_wait = 3.0
+        self._pid = None
+        self._segment = None
+        self._thread = None
+        self._queue = deque()
+        self._pending = {}     # student_id -> number of queued entries
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = bool(app.config.get("SUBMISSION_WRITE_BEHIND"))
+        self.directory = app.config.get("SUBMISSION_JOURNAL_DIR") or os.path.join(app.instance_path, "journal")
+        self.batch_size = int(app.config.get("SUBMISSION_BATCH_SIZE", 200))
+        self.flush_interval = float(app.config.get("SUBMISSION_FLUSH_INTERVAL", 0.05))
+        self.receipt_wait = float(app.config.get("SUBMISSION_RECEIPT_WAIT", 3.0))
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            with app.app_context():
+                self.replay()
+
+    # -- producer side -----------------------------------------------------
+
+    def _ensure_started(self):
+        # (re)open the segment and start the drainer in each worker process; a
+        # segment opened before a fork belongs to the parent
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._write_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            path = os.path.join(self.directory, f"{self._pid}-{uuid.uuid4().hex[:8]}.jsonl")
+            self._segment = open(path, "a", encoding="utf-8")
+            _lock(self._segment)
+            self._queue = deque()
+            self._pending = {}
+            self._thread = threading.Thread(target=self._run, name="submission-journal", daemon=True)
+            self._thread.start()
+
+    def submit(self, student_id, quiz_id, subject_id, score, percent, time_taken_seconds, details, completed_at):
+        """Durably journal a graded attempt and queue it; returns its ticket."""
+        self._ensure_started()
+        entry = {
+            "ticket": uuid.uuid4().hex,
+            "student_id": student_id,
+            "quiz_id": quiz_id,
+            "subject_id": subject_id,
+            "score": score,
+            "percent": percent,
+            "time_taken_seconds": time_taken_seconds,
+            "details": details,
+            "completed_at": completed_at.isoformat(),
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        # journal and queue under one lock: a checkpoint must never see the line
+        # on disk without the entry in the queue
+        with self._write_lock:
+            self._segment.write(line)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            with self._cond:
+                self._queue.append(entry)
+                self._pending[student_id] = self._pending.get(student_id, 0) + 1
+                self._cond.notify_all()
+        return entry["ticket"]
+
+    def settle(self, student_id, timeout=5.0):
+        """Block until this worker has no queued entries for `student_id`."""
+        if not self.enabled or self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending.get(student_id):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+        return True
+
+    def receipt(self, ticket, timeout=None, interval=0.1):
+        """Attempt id written for `ticket`, waiting up to `timeout` seconds for it.
+
+        The entry may be queued on another worker, which this one cannot settle, so
+        the receipts are polled; returns None if it has not been written yet.
+        """
+        timeout = self.receipt_wait if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            found = db.session.get(SubmissionReceipt, ticket)
+            if found is not None:
+                return found.attempt_id
+            if time.monotonic() >= deadline:
+                return None
+            # end the read transaction so the next poll sees new commits
+            db.session.rollback()
+            time.sleep(interval)
+
+    # -- consumer side -----------------------------------------------------
+
+    def _apply(self, entries):
+        """Write entries not yet in SubmissionReceipt; caller commits."""
+        tickets = [e["ticket"] for e in entries]
+        done = {
+            t for (t,) in db.session.query(SubmissionReceipt.ticket)
+            .filter(SubmissionReceipt.ticket.in_(tickets))
+            .all()
+        }
+        applied = []
+        for e in entries:
+            if e["ticket"] in done:
+                continue
+            save_attempt(
+                e["student_id"], e["quiz_id"], e.get("subject_id"), e.get("score"), e.get("percent"),
+                e.get("time_taken_seconds"), e.get("details") or [],
+                datetime.fromisoformat(e["completed_at"]), ticket=e["ticket"],
+            )
+            applied.append(e)
+        return applied
+
+    def _write_batch(self, batch):
+        """Write a batch; raises (after rolling back) if the database is unavailable,
+        in which case nothing was lost and the whole batch can be retried."""
+        from .leaderboard import leaderboard
+        from .stats import get_student_stats
+
+        try:
+            applied = self._apply(batch)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if _transient(e):
+                raise
+            # isolate the failing entry so one bad submission cannot block the rest
+            applied = []
+            for entry in batch:
+                try:
+                    applied.extend(self._apply([entry]))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    if _transient(e):
+                        # entries committed so far are skipped on retry (receipts)
+                        raise
+                    self.app.logger.exception("Could not write journaled submission %s", entry.get("ticket"))
+                    self._park(entry)
+        for student_id in {e["student_id"] for e in applied}:
+            leaderboard.observe(get_student_stats(student_id))
+
+    def _park(self, entry):
+        with open(os.path.join(self.directory, self.FAILED), "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def _run(self):
+        delay = self.RETRY_MIN
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            # give concurrent submissions a moment to join the batch
+            time.sleep(self.flush_interval)
+            with self._cond:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                with self.app.app_context():
+                    self._write_batch(batch)
+            except Exception:
+                # database unavailable or locked: requeue in order and back off
+                self.app.logger.warning("Journal drain failed; retrying in %.1fs", delay, exc_info=True)
+                with self._cond:
+                    self._queue.extendleft(reversed(batch))
+                time.sleep(delay)
+                delay = min(delay * 2, self.RETRY_MAX)
+                continue
+            delay = self.RETRY_MIN
+            with self._cond:
+                for entry in batch:
+                    sid = entry["student_id"]
+                    self._pending[sid] -= 1
+                    if not self._pending[sid]:
+                        del self._pending[sid]
+                empty = not self._queue
+                self._cond.notify_all()
+            if empty:
+                self._checkpoint()
+
+    def _checkpoint(self):
+        # everything written so far is in the database: start the segment over
+        with self._write_lock:
+            with self._cond:
+                if self._queue:
+                    return
+                self._segment.seek(0)
+                self._segment.truncate()
+                os.fsync(self._segment.fileno())
+
+    # -- crash recovery ------------------------------------------------------
+
+    def replay(self):
+        """Apply segments left behind by processes that are no longer running, and
+        retry the entries set aside in failed.jsonl."""
+        failed = os.path.join(self.directory, self.FAILED)
+        try:
+            # claimed by renaming it into an ordinary segment; entries that fail
+            # again are set aside in a new failed.jsonl
+            os.replace(failed, os.path.join(self.directory, f"retry-{uuid.uuid4().hex[:8]}.jsonl"))
+        except FileNotFoundError:
+            pass
+        own = self._segment.name if self._segment is not None else None
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".jsonl") or name == self.FAILED or path == own:
+                continue
+            try:
+                fh = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                # replayed by another worker starting at the same time
+                continue
+            with fh:
+                # a live worker holds the lock on its own segment
+                if not _lock(fh, blocking=False):
+                    continue
+                entries = []
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # torn final line from a crash mid-append; it was never acknowledged
+                        continue
+                try:
+                    for i in range(0, len(entries), self.batch_size):
+                        self._write_batch(entries[i:i + self.batch_size])
+                except Exception:
+                    # database unavailable: keep the segment for the next start
+                    self.app.logger.warning("Could not replay %s; keeping it", name, exc_info=True)
+                    continue
+            os.remove(path)
+            if entries:
+                self.app.logger.info("Replayed %d journaled submissions from %s", len(entries), name)
+
+
+submission_journal = SubmissionJournal()
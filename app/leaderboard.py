@@ -0,0 +1,208 @@
+"""Incremental student leaderboard.
+
+Ranking used to run ``avg(percent) GROUP BY student`` over every QuizAttempt and walk
+the result in Python on each page view. The Leaderboard keeps each student's average
+in memory in score buckets of 0.01 points, with a Fenwick tree counting the occupied
+buckets: moving a student, the dense rank of a student and each entry of the top K
+are O(log buckets). Averages less than 0.01 points apart share a rank.
+
+It is fed from the StudentStats summary rows: every worker applies the rows changed
+since its last sync (an indexed range query on StudentStats.updated_at), so
+submissions handled by other workers are picked up too. Deleting a student bumps the
+'students' data version, which makes every worker reload the rows on its next sync.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from .models import db, Student, StudentStats
+from .http_cache import data_version, STUDENTS
+
+# bucket of an average = round(avg * SCALE); averages are percentages (0-100)
+SCALE = 100
+BUCKETS = 100 * SCALE + 1
+
+
+class FenwickTree:
+    """Prefix sums over `size` counters with O(log size) updates and queries."""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """Sum of the counters [0, index)."""
+        total = 0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k):
+        """Smallest index whose prefix sum through it reaches `k` (k >= 1)."""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+def bucket_of(avg_percent):
+    return min(max(int(round(avg_percent * SCALE)), 0), BUCKETS - 1)
+
+
+class Leaderboard:
+    # rows are re-read from slightly before the watermark so a transaction that
+    # committed late with an older timestamp is not missed; re-applying is idempotent
+    SYNC_SLACK = timedelta(seconds=5)
+    # periodic reload of the StudentStats rows as a safety net
+    FULL_REBUILD_SECONDS = 600
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._watermark = None
+        self._loaded_at = None
+        self._version = None
+
+    def _reset(self):
+        self._entries = {}     # student_id -> (avg_percent, attempts_count, bucket)
+        self._members = {}     # bucket -> set of student ids
+        self._levels = FenwickTree(BUCKETS)  # 1 per occupied bucket
+        self._distinct = 0
+
+    # -- maintenance -------------------------------------------------------
+
+    def _remove(self, student_id):
+        entry = self._entries.pop(student_id, None)
+        if entry is None:
+            return
+        bucket = entry[2]
+        members = self._members.get(bucket)
+        if members is not None:
+            members.discard(student_id)
+            if not members:
+                del self._members[bucket]
+                self._levels.add(bucket, -1)
+                self._distinct -= 1
+
+    def _put(self, student_id, avg_percent, attempts_count):
+        self._remove(student_id)
+        if avg_percent is None:
+            return
+        bucket = bucket_of(avg_percent)
+        self._entries[student_id] = (avg_percent, attempts_count, bucket)
+        members = self._members.get(bucket)
+        if members is None:
+            self._members[bucket] = {student_id}
+            self._levels.add(bucket, 1)
+            self._distinct += 1
+        else:
+            members.add(student_id)
+
+    def _apply(self, stats):
+        avg = stats.percent_sum / stats.percent_count if stats.percent_count else None
+        self._put(stats.student_id, avg, stats.attempts_count or 0)
+        if stats.updated_at is not None and (self._watermark is None or stats.updated_at > self._watermark):
+            self._watermark = stats.updated_at
+
+    def observe(self, stats):
+        """Apply a StudentStats row that was just committed by this worker."""
+        with self._lock:
+            if self._loaded_at is not None and stats is not None:
+                self._apply(stats)
+
+    def rebuild(self, version=None):
+        """Load every student's summary row (students without one are backfilled by
+        `flask backfill-student-stats`, see app.stats)."""
+        if version is None:
+            version = data_version(STUDENTS)
+        rows = StudentStats.query.all()
+        with self._lock:
+            self._reset()
+            self._watermark = None
+            for stats in rows:
+                self._apply(stats)
+            self._loaded_at = time.monotonic()
+            self._version = version
+
+    def sync(self):
+        """Bring the in-memory ranking up to date with the StudentStats table."""
+        version = data_version(STUDENTS)
+        if (
+            self._loaded_at is None
+            or version != self._version
+            or time.monotonic() - self._loaded_at > self.FULL_REBUILD_SECONDS
+        ):
+            self.rebuild(version)
+            return
+        query = StudentStats.query
+        if self._watermark is not None:
+            query = query.filter(StudentStats.updated_at >= self._watermark - self.SYNC_SLACK)
+        rows = query.all()
+        with self._lock:
+            for stats in rows:
+                self._apply(stats)
+
+    # -- queries -----------------------------------------------------------
+
+    def rank_of(self, student_id):
+        """Return (dense_rank, avg_percent) for a student, or (None, None)."""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is None:
+                return None, None
+            # one plus the number of occupied buckets above the student's
+            rank = self._distinct - self._levels.prefix(entry[2] + 1) + 1
+            return rank, round(entry[0], 1)
+
+    def top(self, k):
+        """Return the top `k` students as dicts ordered by dense rank."""
+        picked = []
+        with self._lock:
+            rank = 0
+            while len(picked) < k and rank < self._distinct:
+                rank += 1
+                # the rank-th highest occupied bucket
+                bucket = self._levels.find(self._distinct - rank + 1)
+                for student_id in self._members[bucket]:
+                    avg, attempts, _ = self._entries[student_id]
+                    picked.append((rank, student_id, avg, attempts))
+        if not picked:
+            return []
+
+        names = dict(
+            db.session.query(Student.id, Student.name)
+            .filter(Student.id.in_([p[1] for p in picked]))
+            .all()
+        )
+        ranked = []
+        for rank, student_id, score, attempts in sorted(picked, key=lambda p: (p[0], names.get(p[1]) or '')):
+            if student_id not in names:
+                # student was deleted; drop the stale entry
+                with self._lock:
+                    self._remove(student_id)
+                continue
+            ranked.append({
+                'rank': rank,
+                'student_id': student_id,
+                'name': names[student_id],
+                'avg_percent': round(score, 1),
+                'attempts_count': attempts,
+            })
+        return ranked[:k]
+
+
+# per-worker instance used by the routes
+leaderboard = Leaderboard()
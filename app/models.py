@@ -49,20 +49,29 @@ class Subject(db.Model):
 
 
 class Quiz(db.Model):
+	# a teacher's quizzes newest first; the global "latest quizzes" list
+	__table_args__ = (
+		db.Index('ix_quiz_teacher_id_created_at', 'teacher_id', 'created_at'),
+		db.Index('ix_quiz_created_at', 'created_at'),
+	)
+
 	id = db.Column(db.Integer, primary_key=True)
 	title = db.Column(db.String(200), nullable=False)
 	description = db.Column(db.Text)
 	time_limit = db.Column(db.Integer, default=0)  # minutes
 	difficulty = db.Column(db.String(50))
 	teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=True)
-	subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=True)
+	subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=True, index=True)
 	questions = db.relationship('Question', backref='quiz', cascade='all, delete-orphan', lazy=True)
 	created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+	# content version, bumped on every edit; keys the cached answer key used for grading
+	# (added to existing databases by migration 9a4e6b2c1d05, run at startup)
+	version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
 
 class Question(db.Model):
 	id = db.Column(db.Integer, primary_key=True)
-	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
 	type = db.Column(db.String(20), nullable=False)  # 'mc' or 'tf'
 	text = db.Column(db.Text, nullable=False)
 	# For MC questions, store the correct option key (A/B/C/D). For TF, store 'True'/'False'.
@@ -72,15 +81,32 @@ class Question(db.Model):
 
 class Option(db.Model):
 	id = db.Column(db.Integer, primary_key=True)
-	question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+	question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True)
 	key = db.Column(db.String(5), nullable=False)  # 'A','B','C','D' or other
 	text = db.Column(db.Text, nullable=False)
 
 
+# Serialized student-facing copy of a quiz (questions and options, no answers), built
+# by app.delivery whenever the quiz is created or edited; etag is a digest of payload
+class QuizDelivery(db.Model):
+	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+	version = db.Column(db.Integer, nullable=False)
+	etag = db.Column(db.String(64), nullable=False)
+	payload = db.Column(db.Text, nullable=False)
+	built_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+
 # Records a student's attempt at a quiz
 class QuizAttempt(db.Model):
+	# a student's attempts by completion time (progress, exports, stats rebuilds); all
+	# attempts of some days (analytics rollup rebuilds)
+	__table_args__ = (
+		db.Index('ix_quiz_attempt_student_id_completed_at', 'student_id', 'completed_at'),
+		db.Index('ix_quiz_attempt_completed_at', 'completed_at'),
+	)
+
 	id = db.Column(db.Integer, primary_key=True)
-	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
 	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
 	started_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
 	completed_at = db.Column(db.DateTime, nullable=True)
@@ -98,17 +124,103 @@ class QuizAttempt(db.Model):
 # Individual per-question answers for an attempt
 class AttemptAnswer(db.Model):
 	id = db.Column(db.Integer, primary_key=True)
-	attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempt.id'), nullable=False)
-	question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+	attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempt.id'), nullable=False, index=True)
+	# NULL once the question has been removed from the quiz; the answer stays part of
+	# the graded attempt
+	question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=True, index=True)
 	given_answer = db.Column(db.String(200))
 	is_correct = db.Column(db.Boolean, nullable=True)
 
 
+# Materialized per-student summary, maintained by app.stats when an attempt is recorded
+# so dashboards can read one row instead of aggregating the attempt history.
+class StudentStats(db.Model):
+	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+	attempts_count = db.Column(db.Integer, nullable=False, default=0)
+	percent_sum = db.Column(db.Float, nullable=False, default=0.0)
+	percent_count = db.Column(db.Integer, nullable=False, default=0)
+	time_sum = db.Column(db.Integer, nullable=False, default=0)
+	last_completed_at = db.Column(db.DateTime, nullable=True)
+	# streak of consecutive UTC days with at least one completed attempt, advanced on
+	# submit so the dashboards never have to load the completion history
+	current_streak = db.Column(db.Integer, nullable=False, default=0)
+	longest_streak = db.Column(db.Integer, nullable=False, default=0)
+	last_active_day = db.Column(db.Date, nullable=True)
+	# per-window counters: the counter is only valid while its window start matches
+	day_window = db.Column(db.Date, nullable=True)
+	day_count = db.Column(db.Integer, nullable=False, default=0)
+	week_window = db.Column(db.Date, nullable=True)  # Monday of the ISO week
+	week_count = db.Column(db.Integer, nullable=False, default=0)
+	# bumped on every change so the leaderboard can pick up rows changed by other workers
+	updated_at = db.Column(db.DateTime, nullable=True, index=True)
+
+	# remove the summary together with the student
+	student = db.relationship('Student', backref=db.backref('stats', uselist=False, cascade='all, delete-orphan'))
+
+
+# Per-student, per-subject summary used for the strengths/weaknesses cards
+class StudentSubjectStats(db.Model):
+	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+	subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+	attempts_count = db.Column(db.Integer, nullable=False, default=0)
+	percent_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+	student = db.relationship('Student', backref=db.backref('subject_stats', cascade='all, delete-orphan'))
+	subject = db.relationship('Subject')
+
+
+# Daily rollups of completed attempts, maintained by app.rollups on submit so the
+# analytics views aggregate days x dimensions instead of the raw attempt history
+class DailyQuizStats(db.Model):
+	day = db.Column(db.Date, primary_key=True)
+	quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True, index=True)
+	attempts_count = db.Column(db.Integer, nullable=False, default=0)
+	percent_sum = db.Column(db.Float, nullable=False, default=0.0)
+	percent_count = db.Column(db.Integer, nullable=False, default=0)
+	time_sum = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailySubjectStats(db.Model):
+	day = db.Column(db.Date, primary_key=True)
+	subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+	attempts_count = db.Column(db.Integer, nullable=False, default=0)
+	percent_sum = db.Column(db.Float, nullable=False, default=0.0)
+	percent_count = db.Column(db.Integer, nullable=False, default=0)
+	time_sum = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyStudentStats(db.Model):
+	day = db.Column(db.Date, primary_key=True)
+	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+	attempts_count = db.Column(db.Integer, nullable=False, default=0)
+	percent_sum = db.Column(db.Float, nullable=False, default=0.0)
+	percent_count = db.Column(db.Integer, nullable=False, default=0)
+	time_sum = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Change counters of groups of data (e.g. 'catalog'), bumped in the transaction that
+# changes them; app.http_cache derives ETags from them without reading the data
+class DataVersion(db.Model):
+	name = db.Column(db.String(50), primary_key=True)
+	version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Ticket of a journaled (write-behind) submission, written in the same transaction as
+# its attempt so replaying the journal after a crash never records an attempt twice
+class SubmissionReceipt(db.Model):
+	ticket = db.Column(db.String(32), primary_key=True)
+	attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempt.id'), nullable=False)
+	created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+
 # Messaging models: simple Conversation between a teacher and a student and messages
 class Conversation(db.Model):
+	# inbox lookups by either participant (and the teacher/student pair)
+	__table_args__ = (db.Index('ix_conversation_teacher_id_student_id', 'teacher_id', 'student_id'),)
+
 	id = db.Column(db.Integer, primary_key=True)
 	teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=True)
-	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True)
+	student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True, index=True)
 	created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
 
 	# messages relationship
@@ -120,6 +232,13 @@ class Conversation(db.Model):
 
 
 class Message(db.Model):
+	# history is paged by id within a conversation; unread counts and mark-as-read
+	# filter on the other party's unread messages
+	__table_args__ = (
+		db.Index('ix_message_conversation_id_id', 'conversation_id', 'id'),
+		db.Index('ix_message_conversation_id_sender_role_read', 'conversation_id', 'sender_role', 'read'),
+	)
+
 	id = db.Column(db.Integer, primary_key=True)
 	conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
 	# sender_role: 'teacher' or 'student'
@@ -128,3 +247,15 @@ class Message(db.Model):
 	text = db.Column(db.Text, nullable=False)
 	created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
 	read = db.Column(db.Boolean, nullable=False, default=False)
+
+
+# Notification log for pushed message events ('message' / 'read'); streams in every
+# worker follow it by id, which makes it the cross-process pub/sub channel
+class MessageEvent(db.Model):
+	__table_args__ = (db.Index('ix_message_event_conversation_id_id', 'conversation_id', 'id'),)
+
+	id = db.Column(db.Integer, primary_key=True)
+	conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+	kind = db.Column(db.String(20), nullable=False)
+	payload = db.Column(db.Text, nullable=False)  # JSON
+	created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
@@ -0,0 +1,41 @@
+"""SQLite connection profile.
+
+SQLite's defaults (rollback journal, no busy timeout, a 2 MB page cache) make
+concurrent gunicorn workers serialise badly and fail with "database is locked".
+`init_app` applies the ``SQLITE_PRAGMAS`` profile to every new connection: WAL lets
+readers run alongside the single writer, ``busy_timeout`` makes a blocked writer wait
+instead of failing, and ``synchronous=NORMAL`` is durable across application crashes
+in WAL mode (only a power loss can drop the last commits).
+"""
+from sqlalchemy import event
+
+# applied first so switching the journal mode waits for other connections' locks
+_FIRST = ('busy_timeout',)
+
+
+def pragma_statements(pragmas):
+    ordered = sorted(pragmas.items(), key=lambda item: item[0] not in _FIRST)
+    return [f"PRAGMA {name}={value}" for name, value in ordered if value is not None]
+
+
+def apply_pragmas(engine, pragmas):
+    statements = pragma_statements(pragmas)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def init_app(app, db):
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas:
+        return
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite":
+            apply_pragmas(engine, pragmas)
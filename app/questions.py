@@ -0,0 +1,107 @@
+"""Saving a quiz's questions.
+
+Editing used to delete every Question and Option of the quiz and insert them again
+with a flush per question: a large write transaction for a one-character fix, new
+primary keys on every save and AttemptAnswer rows pointing at deleted questions.
+`sync_questions` diffs the submitted questions against the stored ones by their id
+(sent back by the editor): unchanged rows are left alone, changed rows are updated
+in one executemany, new questions are inserted in one flush and removed questions
+(with their options) are deleted in bulk. Answers students gave to a removed
+question are kept, detached from it, so past results stay as they were graded.
+"""
+from sqlalchemy import update
+
+from .models import db, Question, Option, AttemptAnswer
+
+
+def _parse(q):
+    """Validate one submitted question; returns (id, type, text, correct, options)."""
+    qtype = q.get('type')
+    qtext = q.get('text')
+    correct = q.get('correct')
+    if not qtype or not qtext or correct is None:
+        raise ValueError('Invalid question payload')
+    options = []
+    if qtype == 'mc':
+        for opt in q.get('options') or []:
+            key = opt.get('key')
+            text = opt.get('text')
+            if key and text is not None:
+                options.append((key, text))
+    try:
+        qid = int(q.get('id')) if q.get('id') is not None else None
+    except (TypeError, ValueError):
+        qid = None
+    return qid, qtype, qtext, str(correct), options
+
+
+def _new_question(quiz_id, qtype, qtext, correct, options):
+    question = Question(quiz_id=quiz_id, type=qtype, text=qtext, correct_answer=correct)
+    question.options = [Option(key=key, text=text) for key, text in options]
+    return question
+
+
+def build_question(quiz_id, q):
+    """A new Question (with its options) for the submitted payload `q`; caller adds it."""
+    return _new_question(quiz_id, *_parse(q)[1:])
+
+
+def sync_questions(quiz, submitted):
+    """Apply the submitted question list to `quiz`; returns {'added', 'updated', 'removed'}.
+
+    Questions carrying the id of one of the quiz's questions are updated in place,
+    questions without a (known) id are added, stored questions missing from the
+    list are removed (answers given to them are kept). The caller commits.
+    """
+    parsed = [_parse(q) for q in submitted]
+
+    stored = {
+        qid: (qtype, text, correct)
+        for qid, qtype, text, correct in db.session.query(
+            Question.id, Question.type, Question.text, Question.correct_answer
+        ).filter(Question.quiz_id == quiz.id)
+    }
+    stored_options = {}
+    if stored:
+        rows = (
+            db.session.query(Option.question_id, Option.key, Option.text)
+            .filter(Option.question_id.in_(list(stored)))
+            .order_by(Option.id)
+        )
+        for question_id, key, text in rows:
+            stored_options.setdefault(question_id, []).append((key, text))
+
+    seen = set()
+    changed, reoptioned, added = [], [], []
+    for qid, qtype, qtext, correct, options in parsed:
+        if qid in stored and qid not in seen:
+            seen.add(qid)
+            if stored[qid] != (qtype, qtext, correct):
+                changed.append({'id': qid, 'type': qtype, 'text': qtext, 'correct_answer': correct})
+            if stored_options.get(qid, []) != options:
+                reoptioned.append((qid, options))
+        else:
+            added.append(_new_question(quiz.id, qtype, qtext, correct, options))
+    removed = [qid for qid in stored if qid not in seen]
+
+    if removed:
+        # keep the graded answers to removed questions, no longer pointing at them
+        AttemptAnswer.query.filter(AttemptAnswer.question_id.in_(removed)).update(
+            {AttemptAnswer.question_id: None}, synchronize_session=False
+        )
+    stale = removed + [qid for qid, _ in reoptioned]
+    if stale:
+        Option.query.filter(Option.question_id.in_(stale)).delete(synchronize_session=False)
+    if removed:
+        Question.query.filter(Question.id.in_(removed)).delete(synchronize_session=False)
+    if changed:
+        db.session.execute(update(Question), changed)
+    if reoptioned:
+        db.session.add_all(
+            Option(question_id=qid, key=key, text=text) for qid, options in reoptioned for key, text in options
+        )
+    if added:
+        db.session.add_all(added)
+    db.session.flush()
+    updated = {c['id'] for c in changed} | {qid for qid, _ in reoptioned}
+    return {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
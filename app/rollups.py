@@ -0,0 +1,131 @@
+"""Daily rollups of completed attempts for analytics.
+
+DailyQuizStats, DailySubjectStats and DailyStudentStats hold one row per UTC day and
+quiz / subject / student with the attempt count, percent sum and count, and time
+sum. `record_daily` advances them in the submit transaction (next to
+`stats.record_attempt`), so the analytics views read days x dimensions rows and
+never scan QuizAttempt. `rebuild_rollups` recomputes them from the attempt history,
+either completely (``flask rebuild-rollups``, and once at startup for a database
+from before the rollups) or for the days touched by a deletion or by a quiz moving
+to another subject; the attempts of those days are found with completed_at ranges
+on its index.
+"""
+from datetime import datetime, time, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, Date, and_, or_
+
+from .models import db, Quiz, QuizAttempt, DailyQuizStats, DailySubjectStats, DailyStudentStats
+from .stats import increment
+
+
+def record_daily(quiz_id, subject_id, student_id, percent, time_taken_seconds, completed_at):
+    """Fold one completed attempt into the daily rollups (caller commits)."""
+    day = completed_at.date()
+    seconds = int(time_taken_seconds) if isinstance(time_taken_seconds, (int, float)) else 0
+    counters = {
+        'attempts_count': 1,
+        'percent_sum': float(percent) if percent is not None else 0.0,
+        'percent_count': 1 if percent is not None else 0,
+        'time_sum': seconds,
+    }
+    increment(DailyQuizStats, {'day': day, 'quiz_id': quiz_id}, counters)
+    increment(DailyStudentStats, {'day': day, 'student_id': student_id}, counters)
+    if subject_id is not None:
+        increment(DailySubjectStats, {'day': day, 'subject_id': subject_id}, counters)
+
+
+def quiz_days(quiz_id):
+    """Days on which `quiz_id` has rolled-up attempts."""
+    return [d for (d,) in db.session.query(DailyQuizStats.day).filter(DailyQuizStats.quiz_id == quiz_id).all()]
+
+
+def day_ranges(days):
+    """Half-open [start, end) datetime ranges covering `days`, consecutive days merged."""
+    ranges = []
+    for day in sorted(set(days)):
+        start = datetime.combine(day, time.min)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(days=1)
+        else:
+            ranges.append([start, start + timedelta(days=1)])
+    return ranges
+
+
+def completed_on(days):
+    """Condition matching attempts completed on one of `days` (uses the completed_at index)."""
+    return or_(*(
+        and_(QuizAttempt.completed_at >= start, QuizAttempt.completed_at < end)
+        for start, end in day_ranges(days)
+    ))
+
+
+def rebuild_rollups(days=None, models=None):
+    """Recompute the rollups from QuizAttempt for `days` (all days if None); caller commits.
+
+    `models` limits the rebuild to some of the rollup tables, e.g. [DailySubjectStats]
+    after a quiz changed subject.
+    """
+    day = func.date(QuizAttempt.completed_at, type_=Date)
+    aggregates = [
+        func.count(QuizAttempt.id),
+        func.coalesce(func.sum(QuizAttempt.percent), 0.0),
+        func.count(QuizAttempt.percent),
+        func.coalesce(func.sum(QuizAttempt.time_taken_seconds), 0),
+    ]
+    dimensions = [
+        (DailyQuizStats, 'quiz_id', QuizAttempt.quiz_id, None),
+        (DailyStudentStats, 'student_id', QuizAttempt.student_id, None),
+        (DailySubjectStats, 'subject_id', Quiz.subject_id, Quiz),
+    ]
+    if models is not None:
+        dimensions = [d for d in dimensions if d[0] in models]
+    if days is not None:
+        days = sorted(set(days))
+        if not days:
+            return
+    for model, key, column, join in dimensions:
+        stale = db.session.query(model)
+        if days is not None:
+            stale = stale.filter(model.day.in_(days))
+        stale.delete(synchronize_session=False)
+
+        source = db.session.query(day, column, *aggregates).filter(QuizAttempt.completed_at != None)
+        if join is not None:
+            source = source.join(join, join.id == QuizAttempt.quiz_id).filter(column != None)
+        if days is not None:
+            source = source.filter(completed_on(days))
+        source = source.group_by(day, column)
+        db.session.execute(
+            model.__table__.insert().from_select(
+                ['day', key, 'attempts_count', 'percent_sum', 'percent_count', 'time_sum'],
+                source.statement,
+            )
+        )
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute the daily analytics rollups from the attempt history."""
+    rebuild_rollups()
+    db.session.commit()
+    click.echo('Rebuilt %d quiz, %d subject and %d student daily rows.' % (
+        DailyQuizStats.query.count(), DailySubjectStats.query.count(), DailyStudentStats.query.count()))
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_rollups_command)
+    if not app.config.get("CREATE_TABLES_ON_STARTUP", True):
+        return
+    with app.app_context():
+        # a database from before the rollups existed: build them once here rather
+        # than showing empty analytics until someone runs `flask rebuild-rollups`
+        empty = db.session.query(DailyQuizStats.quiz_id).first() is None
+        if empty and db.session.query(QuizAttempt.id).filter(QuizAttempt.completed_at != None).first() is not None:
+            try:
+                rebuild_rollups()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
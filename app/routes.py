@@ -1,11 +1,30 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, send_file, Response
-import io, csv
-from datetime import datetime, timedelta
-
-from sqlalchemy import func
-
-from .models import db, Subject, Quiz, Question, Option, Teacher
-from .models import Student, QuizAttempt, AttemptAnswer, Conversation, Message
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, send_file, Response, stream_with_context, current_app, make_response
+import io, csv, time, hashlib, importlib.util
+from datetime import datetime
+
+from sqlalchemy import func, case, or_
+
+from .models import db, Subject, Quiz, Teacher
+from .models import Student, QuizAttempt, AttemptAnswer, Conversation, Message, SubmissionReceipt, DailySubjectStats
+from .stats import get_student_stats, summarize, subject_strengths as load_subject_strengths
+from .stats import rebuild_student_stats, rebuild_subject_stats, quiz_students
+from .leaderboard import leaderboard
+from .catalog import DIFFICULTIES, parse_filters, catalog_page, serialize_row
+from .grading import answer_keys, get_answer_key, grade
+from .submissions import save_attempt
+from .rollups import quiz_days, rebuild_rollups
+from .journal import submission_journal
+from .inbox import inbox_page
+from .exports import roster_rows, roster_csv, roster_txt
+from .export_jobs import export_jobs, valid_job_id
+from .dashboard import dashboard_cache
+from .questions import build_question, sync_questions
+from .importer import FORMATS as IMPORT_FORMATS, guess_format, import_bank
+from .search import search_index
+from .http_cache import validated, bump, catalog_version, CATALOG, STUDENTS
+from .delivery import get_delivery, publish as publish_delivery, withdraw as withdraw_delivery
+from .analytics import RANGES as TREND_RANGES, parse_range, performance_trend, performance_cards, chart as trend_chart
+from . import broker
 
 main = Blueprint("main", __name__)
 
@@ -26,6 +45,10 @@ def student_dashboard():
     student = None
     daily_goal = 1
     completed_today = 0
+    quizzes_taken = 0
+    avg_score = None
+    days_streak = 0
+    longest_streak = 0
     if student_id:
         student = Student.query.filter_by(id=student_id).first()
         if student:
@@ -33,124 +56,93 @@ def student_dashboard():
                 daily_goal = int(student.daily_goal or 1)
             except Exception:
                 daily_goal = 1
-        # compute completed today (simple count of attempts in last 24h)
-        try:
-            from datetime import datetime, timedelta
-            now = datetime.utcnow()
-            since = now - timedelta(days=1)
-            completed_today = QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.completed_at >= since).count()
-        except Exception:
-            completed_today = 0
-
-    # compute total quizzes taken by this student
-    quizzes_taken = 0
-    if student_id:
-        try:
-            quizzes_taken = QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None).count()
-        except Exception:
-            quizzes_taken = 0
-
-    # compute average percent score for this student across completed attempts
-    avg_score = None
+        # read the materialized summary instead of aggregating the attempt history
+        submission_journal.settle(student_id)
+        summary = summarize(get_student_stats(student_id))
+        completed_today = summary['completed_today']
+        quizzes_taken = summary['quizzes_taken']
+        avg_score = summary['avg_score']
+        days_streak = summary['days_streak']
+        longest_streak = summary['longest_streak']
+
+    # student's global rank (dense ranking) from the incremental leaderboard
+    current_student_rank = None
+    current_student_avg = None
     if student_id:
         try:
-            # use SQL aggregate to compute average of percent where percent is not null
-            avg_val = db.session.query(func.avg(QuizAttempt.percent)).filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.percent != None).scalar()
-            if avg_val is not None:
-                # round to 1 decimal place
-                try:
-                    avg_score = round(float(avg_val), 1)
-                except Exception:
-                    avg_score = None
-        except Exception:
-            avg_score = None
-
-        # compute consecutive days streak based on completed quiz attempts
-        days_streak = 0
-        if student_id:
-            try:
-                # fetch distinct completed dates (UTC date portion)
-                attempts = (
-                    QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None)
-                    .with_entities(QuizAttempt.completed_at)
-                    .order_by(QuizAttempt.completed_at.desc())
-                    .all()
-                )
-                # build a set of date objects (UTC)
-                completed_dates = set()
-                for (dt,) in attempts:
-                    if dt is None:
-                        continue
-                    try:
-                        # if it's a SQL expression (func.now()) it will be datetime when loaded
-                        d = dt.date()
-                    except Exception:
-                        # fallback: attempt to parse or skip
-                        continue
-                    completed_dates.add(d)
-
-                # compute streak ending today (UTC)
-                today = datetime.utcnow().date()
-                cur = today
-                streak = 0
-                # count backward while each consecutive date exists
-                while cur in completed_dates:
-                    streak += 1
-                    cur = cur - timedelta(days=1)
-                days_streak = streak
-            except Exception:
-                days_streak = 0
-
-        # compute student's global rank (dense ranking) based on average percent across completed attempts
-        current_student_rank = None
-        current_student_avg = None
-        try:
-            averages = (
-                db.session.query(
-                    Student.id.label('student_id'),
-                    func.avg(QuizAttempt.percent).label('avg_percent')
-                )
-                .join(QuizAttempt, QuizAttempt.student_id == Student.id)
-                .filter(QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-                .group_by(Student.id)
-                .order_by(func.avg(QuizAttempt.percent).desc())
-                .all()
-            )
-
-            last_score = None
-            dense_rank = 0
-            for row in averages:
-                avg = float(row.avg_percent) if row.avg_percent is not None else 0.0
-                if last_score is None or avg != last_score:
-                    dense_rank += 1
-                last_score = avg
-                if row.student_id == student_id:
-                    current_student_rank = dense_rank
-                    current_student_avg = round(avg, 1)
-                    break
+            leaderboard.sync()
+            current_student_rank, current_student_avg = leaderboard.rank_of(student_id)
         except Exception:
             current_student_rank = None
             current_student_avg = None
 
-        return render_template("student/dashboard.html", quizzes=quizzes, daily_goal=daily_goal, daily_completed=completed_today, quizzes_taken=quizzes_taken, avg_score=avg_score, days_streak=days_streak, current_student_rank=current_student_rank, current_student_avg=current_student_avg)
+    return render_template("student/dashboard.html", quizzes=quizzes, daily_goal=daily_goal, daily_completed=completed_today, quizzes_taken=quizzes_taken, avg_score=avg_score, days_streak=days_streak, longest_streak=longest_streak, current_student_rank=current_student_rank, current_student_avg=current_student_avg)
 
 
 @main.route("/student/quizzes")
+@validated(catalog_version)
 def student_quizzes():
-    # show all available quizzes for students (most recent first)
-    quizzes = Quiz.query.order_by(Quiz.created_at.desc()).all()
-    return render_template("student/quizzes.html", quizzes=quizzes)
+    # show one page of available quizzes (most recent first), filtered server-side
+    filters = parse_filters(request.args)
+    next_offset = None
+    try:
+        if filters['q']:
+            # ranked full-text search
+            quizzes, next_offset = search_index.search_page(filters)
+            next_cursor = None
+        else:
+            quizzes, next_cursor = catalog_page(filters)
+    except Exception:
+        db.session.rollback()
+        quizzes, next_cursor = [], None
+    subjects = Subject.query.order_by(Subject.name.asc()).all()
+    teachers = Teacher.query.order_by(Teacher.name.asc()).all()
+    return render_template("student/quizzes.html", quizzes=quizzes, next_cursor=next_cursor, next_offset=next_offset, filters=filters, subjects=subjects, teachers=teachers, difficulties=DIFFICULTIES)
+
+
+# API: same catalog page as JSON (for infinite scrolling or other clients)
+@main.route("/api/quizzes")
+@validated(catalog_version)
+def api_quiz_catalog():
+    filters = parse_filters(request.args)
+    if filters['q']:
+        # ranked search results page by offset instead of by cursor
+        quizzes, next_offset = search_index.search_page(filters)
+        return jsonify({'quizzes': [serialize_row(q, n) for q, n in quizzes], 'next_cursor': None, 'next_offset': next_offset})
+    quizzes, next_cursor = catalog_page(filters)
+    return jsonify({'quizzes': [serialize_row(q, n) for q, n in quizzes], 'next_cursor': next_cursor})
+
+# API: the student-facing quiz content (questions and options, no answers)
+@main.route('/api/quizzes/<int:quiz_id>/delivery')
+def api_quiz_delivery(quiz_id):
+    delivery, hit = get_delivery(quiz_id)
+    if delivery is None:
+        return jsonify({"error": "Quiz not found"}), 404
+    response = Response(delivery['body'], mimetype='application/json')
+    response.set_etag(delivery['etag'])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response.make_conditional(request)
 
 @main.route('/student/quizzes/take/<int:quiz_id>', methods=["GET", "POST"])
 def student_take_quiz(quiz_id):
     # GET: render quiz for student to take
     if request.method == 'GET':
-        quiz = Quiz.query.filter_by(id=quiz_id).first()
-        if not quiz:
+        # one lookup of the stored delivery payload; the page is rendered once per
+        # payload version and worker, and browsers revalidate it by ETag
+        delivery, hit = get_delivery(quiz_id)
+        if delivery is None:
             flash('Quiz not found.', 'error')
             return redirect(url_for('main.student_quizzes'))
-        # Render template with quiz and questions/options
-        return render_template('student/take_quiz.html', quiz=quiz)
+        if 'page' not in delivery:
+            page = render_template('student/take_quiz.html', quiz=delivery['payload'])
+            delivery['page_etag'] = hashlib.sha256(page.encode('utf-8')).hexdigest()[:32]
+            delivery['page'] = page
+        response = make_response(delivery['page'])
+        response.set_etag(delivery['page_etag'])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response.make_conditional(request)
 
     # POST: grade submission (expect JSON payload with answers)
     # Payload format: { "answers": { "<question_id>": "<answer>", ... } }
@@ -158,39 +150,14 @@ def student_take_quiz(quiz_id):
     answers = data.get('answers', {})
     # optional elapsed time (seconds) from client
     time_taken_seconds = data.get('time_taken_seconds')
-    quiz = Quiz.query.filter_by(id=quiz_id).first()
+    quiz = db.session.query(Quiz.id, Quiz.version, Quiz.subject_id).filter(Quiz.id == quiz_id).first()
     if not quiz:
         return jsonify({"error": "Quiz not found"}), 404
 
-    total = len(quiz.questions)
-    correct_count = 0
-    details = []
-    for q in quiz.questions:
-        qid = str(q.id)
-        given = answers.get(qid)
-        is_correct = False
-        # normalize True/False
-        if q.type == 'tf':
-            # Accept boolean or string
-            if isinstance(given, bool):
-                given_norm = 'True' if given else 'False'
-            else:
-                given_norm = str(given)
-            is_correct = given_norm == q.correct_answer
-        else:
-            # mc: compare string keys (A/B/C...)
-            if given is not None:
-                is_correct = str(given).strip() == str(q.correct_answer).strip()
-
-        if is_correct:
-            correct_count += 1
-
-        details.append({
-            "question_id": q.id,
-            "given": given,
-            "correct_answer": q.correct_answer,
-            "is_correct": is_correct,
-        })
+    # grade in memory against the cached answer key for this quiz version
+    answer_key = get_answer_key(quiz.id, quiz.version)
+    total = len(answer_key)
+    correct_count, details = grade(answer_key, answers)
 
     score = correct_count
     percent = (score / total * 100) if total > 0 else 0
@@ -208,67 +175,107 @@ def student_take_quiz(quiz_id):
         ss = secs % 60
         result['time_taken_seconds'] = secs
         result['time_taken'] = f"{mm:02d}:{ss:02d}"
-    # store last result in session for display on results page
-    # Persist attempt to DB if a student is logged in
-    attempt_id = None
+    # Persist attempt to DB if a student is logged in; the session only carries the
+    # attempt id (or journal ticket) and the results page is rendered from the DB
     student_id = session.get('student_id')
+    if student_id and submission_journal.enabled:
+        # write-behind: journal durably, acknowledge now, write in the background
+        ticket = submission_journal.submit(student_id, quiz.id, quiz.subject_id, score, percent, time_taken_seconds, details, datetime.utcnow())
+        session.pop('last_attempt_id', None)
+        session['last_attempt_ticket'] = ticket
+        # shown by the results page if the attempt is not written by then
+        unanswered = sum(1 for d in details if d.get('given') is None or str(d.get('given')).strip() == '')
+        session['last_attempt_result'] = dict(
+            {k: v for k, v in result.items() if k != 'details'}, unanswered=unanswered)
+        return jsonify({"redirect": url_for('main.student_quiz_results')}), 200
     if student_id:
         try:
-            attempt = QuizAttempt(quiz_id=quiz.id, student_id=student_id, completed_at=db.func.now(), score=score, percent=percent, time_taken_seconds=time_taken_seconds)
-            db.session.add(attempt)
-            db.session.flush()  # get attempt.id
-            # store per-question answers
-            for d in details:
-                aa = AttemptAnswer(attempt_id=attempt.id, question_id=d.get('question_id'), given_answer=str(d.get('given')) if d.get('given') is not None else None, is_correct=d.get('is_correct'))
-                db.session.add(aa)
+            # attempt + all answers as batched inserts in one short transaction
+            attempt_id = save_attempt(student_id, quiz.id, quiz.subject_id, score, percent, time_taken_seconds, details, datetime.utcnow())
             db.session.commit()
-            attempt_id = attempt.id
-            # include attempt id in result for traceability
-            result['attempt_id'] = attempt_id
+            leaderboard.observe(get_student_stats(student_id))
+            session.pop('last_attempt_ticket', None)
+            session.pop('last_attempt_result', None)
+            session['last_attempt_id'] = attempt_id
+            return jsonify({"redirect": url_for('main.student_attempt_results', attempt_id=attempt_id), "attempt_id": attempt_id}), 200
         except Exception:
             db.session.rollback()
-            # If DB save fails, continue gracefully and just keep result in session
-            attempt_id = None
 
-    try:
-        # include attempt id in session result when available
-        if attempt_id:
-            result['_attempt_id'] = attempt_id
-        session['last_quiz_result'] = result
-    except Exception:
-        # if session can't store (very large), just return result JSON
-        return jsonify(result), 200
+    # not logged in or the save failed: return the graded result for inline display
+    return jsonify(result), 200
 
-    return jsonify({"redirect": url_for('main.student_quiz_results')}), 200
 
 @main.route("/student/quizzes/results")
 def student_quiz_results():
-    # display the most recent quiz result stored in session (one-off)
-    result = session.pop('last_quiz_result', None)
-    quiz = None
+    # show the most recent attempt of this session
+    student_id = session.get('student_id')
+    ticket = session.get('last_attempt_ticket')
+    if student_id and ticket:
+        # write-behind submission: wait for it to be written, then resolve its attempt.
+        # It may be queued on another worker, so the receipt is polled for a moment
+        submission_journal.settle(student_id)
+        attempt_id = submission_journal.receipt(ticket)
+        if attempt_id is None:
+            # not written yet: show the graded result from the submission and keep
+            # the ticket, so reloading the page shows the stored attempt
+            result = session.get('last_attempt_result')
+            if result:
+                quiz = db.session.get(Quiz, result['quiz_id'])
+                unanswered = result.get('unanswered', 0)
+                counts = {
+                    'correct': result['correct'],
+                    'incorrect': max(0, result['total_questions'] - result['correct'] - unanswered),
+                    'unanswered': unanswered,
+                }
+                return render_template("student/quiz_results.html", quiz=quiz, result=result, counts=counts)
+        else:
+            session.pop('last_attempt_ticket', None)
+            session.pop('last_attempt_result', None)
+            session['last_attempt_id'] = attempt_id
+    attempt_id = session.get('last_attempt_id')
+    if attempt_id:
+        return redirect(url_for('main.student_attempt_results', attempt_id=attempt_id))
+    return render_template("student/quiz_results.html", quiz=None, result=None, counts={'correct': 0, 'incorrect': 0, 'unanswered': 0})
+
+
+@main.route("/student/quizzes/results/<int:attempt_id>")
+def student_attempt_results(attempt_id):
+    # results of a stored attempt, rebuilt from QuizAttempt/AttemptAnswer so they can be re-viewed
+    student_id = session.get('student_id')
+    teacher_id = session.get('teacher_id')
+    attempt = QuizAttempt.query.filter_by(id=attempt_id).first()
+    if not attempt or not (teacher_id or attempt.student_id == student_id):
+        flash('Result not found.', 'error')
+        return redirect(url_for('main.student_quizzes'))
+
+    unanswered_expr = case((or_(AttemptAnswer.given_answer == None, func.trim(AttemptAnswer.given_answer) == ''), 1))
+    total, correct_answers, unanswered = (
+        db.session.query(
+            func.count(AttemptAnswer.id),
+            func.count(case((AttemptAnswer.is_correct == True, 1))),
+            func.count(unanswered_expr),
+        )
+        .filter(AttemptAnswer.attempt_id == attempt.id)
+        .one()
+    )
+    correct = attempt.score if attempt.score is not None else int(correct_answers or 0)
+    result = {
+        'quiz_id': attempt.quiz_id,
+        'attempt_id': attempt.id,
+        'total_questions': int(total or 0),
+        'correct': correct,
+        'percent': attempt.percent or 0,
+    }
+    if isinstance(attempt.time_taken_seconds, (int, float)):
+        secs = int(attempt.time_taken_seconds)
+        result['time_taken_seconds'] = secs
+        result['time_taken'] = f"{secs // 60:02d}:{secs % 60:02d}"
     counts = {
-        'correct': 0,
-        'incorrect': 0,
-        'unanswered': 0,
+        'correct': correct,
+        'incorrect': max(0, result['total_questions'] - correct - int(unanswered or 0)),
+        'unanswered': int(unanswered or 0),
     }
-    if result:
-        quiz_id = result.get('quiz_id')
-        if quiz_id:
-            quiz = Quiz.query.filter_by(id=quiz_id).first()
-        details = result.get('details', []) or []
-        total = result.get('total_questions', 0)
-        correct = result.get('correct', 0)
-        unanswered = 0
-        for d in details:
-            given = d.get('given')
-            if given is None or (isinstance(given, str) and given.strip() == ''):
-                unanswered += 1
-        incorrect = max(0, total - correct - unanswered)
-        counts['correct'] = correct
-        counts['incorrect'] = incorrect
-        counts['unanswered'] = unanswered
-
-    return render_template("student/quiz_results.html", quiz=quiz, result=result, counts=counts)
+    return render_template("student/quiz_results.html", quiz=attempt.quiz, result=result, counts=counts)
 
 @main.route("/teacher/dashboard")
 def teacher_dashboard():
@@ -281,72 +288,22 @@ def teacher_dashboard():
             .limit(5)
             .all()
         )
-    # compute totals and recent deltas (last 7 days)
+    # totals and recent deltas (last 7 days), one query per teacher behind a short TTL cache
     try:
-        now = datetime.utcnow()
-        cutoff = now - timedelta(days=7)
-
-        if teacher_id:
-            total_quizzes = Quiz.query.filter_by(teacher_id=teacher_id).count()
-            new_quizzes = (
-                Quiz.query.filter(Quiz.teacher_id == teacher_id, Quiz.created_at >= cutoff).count()
-            )
-
-            # total_subjects as distinct subjects used by this teacher's quizzes
-            total_subjects = (
-                db.session.query(func.count(func.distinct(Quiz.subject_id)))
-                .filter(Quiz.teacher_id == teacher_id, Quiz.subject_id != None)
-                .scalar()
-                or 0
-            )
-
-            # new_subjects: distinct subjects which had a quiz created in the cutoff window
-            new_subjects = (
-                db.session.query(func.count(func.distinct(Quiz.subject_id)))
-                .filter(Quiz.teacher_id == teacher_id, Quiz.created_at >= cutoff, Quiz.subject_id != None)
-                .scalar()
-                or 0
-            )
-        else:
-            total_quizzes = Quiz.query.count()
-            new_quizzes = Quiz.query.filter(Quiz.created_at >= cutoff).count()
-            total_subjects = Subject.query.count()
-            new_subjects = (
-                db.session.query(func.count(func.distinct(Quiz.subject_id)))
-                .filter(Quiz.created_at >= cutoff, Quiz.subject_id != None)
-                .scalar()
-                or 0
-            )
-
-        # total students (all students in system)
-        try:
-            total_students = Student.query.count()
-        except Exception:
-            total_students = 0
-
-        # new students: Student model has no created_at column; default to 0
-        new_students = 0
+        counts, hit = dashboard_cache.get(teacher_id)
+        cache_status = 'HIT' if hit else 'MISS'
     except Exception:
-        total_quizzes = None
-        new_quizzes = None
-        total_subjects = None
-        new_subjects = None
-        total_students = None
-        new_students = None
+        db.session.rollback()
+        cache_status = 'MISS'
+        counts = dict.fromkeys(('total_quizzes', 'new_quizzes', 'total_subjects', 'new_subjects', 'total_students', 'new_students'))
 
-    return render_template(
-        "teacher/dashboard.html",
-        recent_quizzes=recent_quizzes,
-        total_quizzes=total_quizzes,
-        new_quizzes=new_quizzes,
-        total_subjects=total_subjects,
-        new_subjects=new_subjects,
-        total_students=total_students,
-        new_students=new_students,
-    )
+    response = make_response(render_template("teacher/dashboard.html", recent_quizzes=recent_quizzes, **counts))
+    response.headers['X-Cache'] = cache_status
+    return response
 
 
 @main.route("/teacher/subjects")
+@validated(catalog_version)
 def teacher_subjects():
     subjects = Subject.query.all()
     return render_template("teacher/subjects.html", subjects=subjects)
@@ -379,18 +336,27 @@ def teacher_create_subject():
         grade_level=grade_level
     )
     db.session.add(subject)
+    bump(CATALOG)
     db.session.commit()
+    # the all-quizzes dashboard counts every subject
+    dashboard_cache.clear()
     return jsonify({"status": "success", "subject_id": subject.id}), 201
 
 
 @main.route("/teacher/quizzes")
+@validated(catalog_version)
 def teacher_quizzes():
     from .models import Quiz
     teacher_id = session.get('teacher_id')
+    q = (request.args.get('q') or '').strip()
     quizzes = []
-    if teacher_id:
+    if teacher_id and q:
+        # ranked search over this teacher's quizzes (best 100 matches)
+        rows, _ = search_index.search_page({'q': q, 'teacher_id': teacher_id, 'limit': 100})
+        quizzes = [quiz for quiz, _ in rows]
+    elif teacher_id:
         quizzes = Quiz.query.filter_by(teacher_id=teacher_id).order_by(Quiz.id.desc()).all()
-    return render_template("teacher/quizzes.html", quizzes=quizzes)
+    return render_template("teacher/quizzes.html", quizzes=quizzes, q=q)
 
 
 @main.route("/teacher/quizzes/create", methods=["GET", "POST"])
@@ -431,34 +397,47 @@ def teacher_create_quiz():
         db.session.add(quiz)
         db.session.flush()
 
-        for q in questions:
-            qtype = q.get('type')
-            qtext = q.get('text')
-            correct = q.get('correct')
-            opts = q.get('options', [])
-            if not qtype or not qtext or correct is None:
-                raise ValueError('Invalid question payload')
-
-            question = Question(quiz=quiz, type=qtype, text=qtext, correct_answer=str(correct))
-            db.session.add(question)
-            db.session.flush()
-
-            # options for MC questions
-            if qtype == 'mc':
-                for opt in opts:
-                    key = opt.get('key')
-                    text = opt.get('text')
-                    if key and text is not None:
-                        option = Option(question=question, key=key, text=text)
-                        db.session.add(option)
+        db.session.add_all(build_question(quiz.id, q) for q in questions)
+        search_index.index([quiz.id])
+        publish_delivery([quiz.id])
+        bump(CATALOG)
 
         db.session.commit()
+        dashboard_cache.invalidate(teacher_id)
         return jsonify({"status": "success", "quiz_id": quiz.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+@main.route("/teacher/quizzes/import", methods=["POST"])
+def teacher_import_quizzes():
+    """Import a CSV, JSON-lines or DOCX question bank (multipart field `file`). Returns JSON."""
+    teacher_id = session.get('teacher_id')
+    if not teacher_id:
+        return jsonify({"error": "Authentication required: teacher must be logged in"}), 401
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({"error": "Missing question bank file"}), 400
+    fmt = request.form.get('format') or guess_format(upload.filename)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"error": "Unsupported format; use csv, jsonl or docx"}), 400
+    if fmt == 'docx' and importlib.util.find_spec('docx') is None:
+        return jsonify({"error": "DOCX import requires the python-docx package to be installed."}), 400
+
+    # read and database errors are reported per row in the report, with whatever
+    # was saved before them
+    try:
+        report = import_bank(upload.stream, fmt, teacher_id, batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 500))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Import failed: {e}"}), 500
+    if report.quizzes:
+        dashboard_cache.invalidate(teacher_id)
+    status = 201 if report.questions else 400
+    return jsonify(dict(report.to_dict(), status="success" if report.questions else "error")), status
+
+
 @main.route("/teacher/students")
 def teacher_students():
     # Show list of students with total quizzes taken and average percent score
@@ -506,6 +485,14 @@ def teacher_students():
     return render_template("teacher/students.html", students=students)
 
 
+def _stream_download(chunks, filename, mimetype):
+    # the generator runs after the view returns, so keep the app context alive for it
+    resp = Response(stream_with_context(chunks), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
 @main.route('/teacher/students/export')
 def teacher_export_students():
     """Export the students list in TXT, CSV (Excel) or PDF format.
@@ -513,117 +500,63 @@ def teacher_export_students():
     """
     fmt = (request.args.get('format') or 'csv').lower()
 
-    # build students list (same as teacher_students)
-    try:
-        rows = (
-            db.session.query(
-                Student.id.label('id'),
-                Student.name.label('name'),
-                Student.email.label('email'),
-                func.count(QuizAttempt.id).label('total_taken'),
-                func.avg(QuizAttempt.percent).label('avg_percent')
-            )
-            .outerjoin(QuizAttempt, QuizAttempt.student_id == Student.id)
-            .group_by(Student.id)
-            .order_by(Student.name.asc())
-            .all()
-        )
-
-        students = []
-        for r in rows:
-            avg = None
-            try:
-                if r.avg_percent is not None:
-                    avg = round(float(r.avg_percent), 1)
-            except Exception:
-                avg = None
-
-            students.append({
-                'id': r.id,
-                'name': r.name,
-                'email': r.email,
-                'total_taken': int(r.total_taken or 0),
-                'avg_percent': avg,
-            })
-    except Exception:
-        # fallback to simple list
-        students = []
-        try:
-            for s in Student.query.order_by(Student.name.asc()).all():
-                students.append({'id': s.id, 'name': s.name, 'email': s.email, 'total_taken': 0, 'avg_percent': None})
-        except Exception:
-            students = []
-
-    # TXT output
+    # TXT and CSV (Excel-friendly) are streamed straight from the database cursor
     if fmt == 'txt':
-        out = io.StringIO()
-        out.write('Name\tEmail\tQuizzes Taken\tAvg Score\n')
-        for s in students:
-            avg = '' if s.get('avg_percent') is None else f"{s.get('avg_percent')}%"
-            out.write(f"{s.get('name')}\t{s.get('email')}\t{s.get('total_taken')}\t{avg}\n")
-        bio = io.BytesIO()
-        bio.write(out.getvalue().encode('utf-8'))
-        bio.seek(0)
-        return send_file(bio, as_attachment=True, download_name='students.txt', mimetype='text/plain')
-
-    # CSV (Excel-friendly)
+        return _stream_download(roster_txt(roster_rows()), 'students.txt', 'text/plain; charset=utf-8')
     if fmt == 'csv' or fmt == 'excel':
-        out = io.StringIO()
-        writer = csv.writer(out)
-        writer.writerow(['Name', 'Email', 'Quizzes Taken', 'Avg Score'])
-        for s in students:
-            avg = '' if s.get('avg_percent') is None else str(s.get('avg_percent'))
-            writer.writerow([s.get('name'), s.get('email'), s.get('total_taken'), avg])
-        bio = io.BytesIO()
-        bio.write(out.getvalue().encode('utf-8-sig'))
-        bio.seek(0)
-        return send_file(bio, as_attachment=True, download_name='students.csv', mimetype='text/csv')
+        return _stream_download(roster_csv(roster_rows()), 'students.csv', 'text/csv; charset=utf-8')
 
-    # PDF (optional dependency: reportlab)
+    # PDF (optional dependency: reportlab) is rendered by a background export job
     if fmt == 'pdf':
-        try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import letter
-        except Exception:
+        if importlib.util.find_spec('reportlab') is None:
             flash('PDF export requires the reportlab package to be installed.', 'error')
             return redirect(url_for('main.teacher_students'))
-
-        bio = io.BytesIO()
-        c = canvas.Canvas(bio, pagesize=letter)
-        width, height = letter
-        x = 40
-        y = height - 40
-        c.setFont('Helvetica-Bold', 14)
-        c.drawString(x, y, 'Students')
-        y -= 24
-        c.setFont('Helvetica', 10)
-        c.drawString(x, y, 'Name')
-        c.drawString(x+220, y, 'Email')
-        c.drawString(x+420, y, 'Taken')
-        c.drawString(x+480, y, 'Avg')
-        y -= 14
-        c.line(x, y, width-40, y)
-        y -= 14
-        for s in students:
-            if y < 60:
-                c.showPage()
-                y = height - 40
-            avg = '' if s.get('avg_percent') is None else f"{s.get('avg_percent')}%"
-            c.drawString(x, y, str(s.get('name') or ''))
-            c.drawString(x+220, y, str(s.get('email') or ''))
-            c.drawString(x+420, y, str(s.get('total_taken') or ''))
-            c.drawString(x+480, y, avg)
-            y -= 16
-
-        c.save()
-        bio.seek(0)
-        return send_file(bio, as_attachment=True, download_name='students.pdf', mimetype='application/pdf')
+        rows = [(s['name'], s['email'], s['total_taken'], s['avg_percent']) for s in roster_rows()]
+        job_id = export_jobs.submit('roster_pdf', [rows], 'students.pdf', 'application/pdf')
+        return _export_job_response(job_id)
 
     # unknown format -> redirect back
     flash('Unknown export format.', 'error')
     return redirect(url_for('main.teacher_students'))
 
 
+def _export_job_response(job_id):
+    # cached artifacts download right away; otherwise wait on the status page
+    if export_jobs.status(job_id) == 'ready':
+        return redirect(url_for('main.download_export', job_id=job_id))
+    return redirect(url_for('main.export_status_page', job_id=job_id))
+
+
+@main.route('/teacher/exports/<job_id>')
+def export_status_page(job_id):
+    if not valid_job_id(job_id) or export_jobs.status(job_id) is None:
+        flash('Export not found.', 'error')
+        return redirect(url_for('main.teacher_students'))
+    return render_template('teacher/export_status.html', job_id=job_id)
+
+
+# API: export job status
+@main.route('/api/exports/<job_id>')
+def api_export_status(job_id):
+    status = export_jobs.status(job_id) if valid_job_id(job_id) else None
+    if status is None:
+        return jsonify({'error': 'Export not found'}), 404
+    payload = {'job_id': job_id, 'status': status}
+    if status == 'ready':
+        payload['download_url'] = url_for('main.download_export', job_id=job_id)
+    return jsonify(payload)
+
+
+@main.route('/teacher/exports/<job_id>/download')
+def download_export(job_id):
+    found = export_jobs.artifact(job_id) if valid_job_id(job_id) else None
+    if not found:
+        flash('Export not ready.', 'error')
+        return redirect(url_for('main.teacher_students'))
+    path, meta = found
+    return send_file(path, as_attachment=True, download_name=meta['filename'], mimetype=meta['mimetype'], max_age=0)
+
+
 @main.route('/teacher/student/<int:student_id>')
 def teacher_view_student(student_id):
     """Teacher-facing view of a single student's progress.
@@ -653,76 +586,25 @@ def teacher_view_student(student_id):
         .all()
     )
 
-    # aggregate metrics similar to student_dashboard
-    quizzes_taken = QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None).count()
-
-    avg_score = None
-    try:
-        avg_val = db.session.query(func.avg(QuizAttempt.percent)).filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.percent != None).scalar()
-        if avg_val is not None:
-            avg_score = round(float(avg_val), 1)
-    except Exception:
-        avg_score = None
-
-    # streak
-    days_streak = 0
-    try:
-        attempts_dates = (
-            QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None)
-            .with_entities(QuizAttempt.completed_at)
-            .order_by(QuizAttempt.completed_at.desc())
-            .all()
-        )
-        completed_dates = set()
-        for (dt,) in attempts_dates:
-            if dt:
-                try:
-                    completed_dates.add(dt.date())
-                except Exception:
-                    continue
-        today = datetime.utcnow().date()
-        cur = today
-        streak = 0
-        while cur in completed_dates:
-            streak += 1
-            cur = cur - timedelta(days=1)
-        days_streak = streak
-    except Exception:
-        days_streak = 0
+    # aggregate metrics similar to student_dashboard, read from the materialized summary
+    submission_journal.settle(student_id)
+    summary = summarize(get_student_stats(student_id))
+    quizzes_taken = summary['quizzes_taken']
+    avg_score = summary['avg_score']
+    days_streak = summary['days_streak']
+    longest_streak = summary['longest_streak']
 
     # ranking among students
-    current_student_rank = None
-    current_student_avg = None
     try:
-        averages = (
-            db.session.query(
-                Student.id.label('student_id'),
-                func.avg(QuizAttempt.percent).label('avg_percent')
-            )
-            .join(QuizAttempt, QuizAttempt.student_id == Student.id)
-            .filter(QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-            .group_by(Student.id)
-            .order_by(func.avg(QuizAttempt.percent).desc())
-            .all()
-        )
-        last_score = None
-        dense_rank = 0
-        for row in averages:
-            avg = float(row.avg_percent) if row.avg_percent is not None else 0.0
-            if last_score is None or avg != last_score:
-                dense_rank += 1
-            last_score = avg
-            if row.student_id == student_id:
-                current_student_rank = dense_rank
-                current_student_avg = round(avg, 1)
-                break
+        leaderboard.sync()
+        current_student_rank, current_student_avg = leaderboard.rank_of(student_id)
     except Exception:
         current_student_rank = None
         current_student_avg = None
 
     # today's goal and completed count
     dg = student.daily_goal if student and getattr(student, 'daily_goal', None) is not None else 1
-    dc = QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.completed_at >= (datetime.utcnow() - timedelta(days=1))).count()
+    dc = summary['completed_today']
 
     # weekly goal calculation (mirror student_progress)
     try:
@@ -732,9 +614,7 @@ def teacher_view_student(student_id):
                 weekly_goal_total = int(student.weekly_goal)
             except Exception:
                 weekly_goal_total = 5
-        now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
-        weekly_goal_completed = QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.completed_at >= week_start).count()
+        weekly_goal_completed = summary['completed_this_week']
         weekly_goal_percent = int((weekly_goal_completed / weekly_goal_total) * 100) if weekly_goal_total > 0 else 0
         if weekly_goal_percent > 100:
             weekly_goal_percent = 100
@@ -745,34 +625,13 @@ def teacher_view_student(student_id):
         weekly_goal_percent = 0
         weekly_goal_message = "Weekly progress unavailable"
 
-    # compute per-subject average percent for this student (strengths/weaknesses)
-    subject_strengths = []
+    # per-subject average percent for this student (strengths/weaknesses)
     try:
-        rows = (
-            db.session.query(
-                Subject.id.label('subject_id'),
-                Subject.name.label('subject_name'),
-                func.avg(QuizAttempt.percent).label('avg_percent'),
-                func.count(QuizAttempt.id).label('attempts_count')
-            )
-            .join(Quiz, Quiz.subject_id == Subject.id)
-            .join(QuizAttempt, QuizAttempt.quiz_id == Quiz.id)
-            .filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-            .group_by(Subject.id)
-            .order_by(func.avg(QuizAttempt.percent).desc())
-            .all()
-        )
-        for r in rows:
-            subject_strengths.append({
-                'id': r.subject_id,
-                'name': r.subject_name,
-                'avg_percent': round(float(r.avg_percent), 1) if r.avg_percent is not None else 0.0,
-                'attempts': int(r.attempts_count),
-            })
+        subject_strengths = load_subject_strengths(student_id)
     except Exception:
         subject_strengths = []
 
-    return render_template('partials/view_student.html', quizzes=quizzes, daily_goal=dg, daily_completed=dc, quizzes_taken=quizzes_taken, avg_score=avg_score, days_streak=days_streak, current_student_rank=current_student_rank, current_student_avg=current_student_avg, student=student, weekly_goal_total=weekly_goal_total, weekly_goal_completed=weekly_goal_completed, weekly_goal_percent=weekly_goal_percent, weekly_goal_message=weekly_goal_message, subject_strengths=subject_strengths)
+    return render_template('partials/view_student.html', quizzes=quizzes, daily_goal=dg, daily_completed=dc, quizzes_taken=quizzes_taken, avg_score=avg_score, days_streak=days_streak, longest_streak=longest_streak, current_student_rank=current_student_rank, current_student_avg=current_student_avg, student=student, weekly_goal_total=weekly_goal_total, weekly_goal_completed=weekly_goal_completed, weekly_goal_percent=weekly_goal_percent, weekly_goal_message=weekly_goal_message, subject_strengths=subject_strengths)
 
 
 @main.route('/teacher/student/<int:student_id>/export')
@@ -832,103 +691,135 @@ def teacher_export_student_attempts(student_id):
         filename = f"{(student.name or 'student').replace(' ', '_')}_attempts.csv"
         return send_file(bio, as_attachment=True, download_name=filename, mimetype='text/csv')
 
-    # DOCX (Word) - optional dependency: python-docx
+    # DOCX (Word) - optional dependency: python-docx; rendered by a background export job
     if fmt == 'docx':
-        # Prefer python-docx for a proper .docx when available
-        try:
-            from docx import Document
-            has_docx = True
-        except Exception:
-            has_docx = False
-
-        if has_docx:
-            doc = Document()
-            doc.add_heading(f"Quiz Attempts - {student.name}", level=1)
-            table = doc.add_table(rows=1, cols=6)
-            hdr_cells = table.rows[0].cells
-            hdr_cells[0].text = 'Title'
-            hdr_cells[1].text = 'Subject'
-            hdr_cells[2].text = 'Completed At'
-            hdr_cells[3].text = 'Score'
-            hdr_cells[4].text = 'Percent'
-            hdr_cells[5].text = 'Time'
-            for r in rows:
-                row_cells = table.add_row().cells
-                for i, val in enumerate(r):
-                    row_cells[i].text = str(val or '')
-
-            bio = io.BytesIO()
-            doc.save(bio)
-            bio.seek(0)
-            filename = f"{(student.name or 'student').replace(' ', '_')}_attempts.docx"
-            return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-
-        # Fallback: return a simple HTML document with .doc extension — Word can open this
-        html = ['<html><head><meta charset="utf-8" /><title>Quiz Attempts</title></head><body>']
-        html.append(f'<h1>Quiz Attempts - {student.name}</h1>')
-        html.append('<table border="1" cellspacing="0" cellpadding="4">')
-        html.append('<tr><th>Title</th><th>Subject</th><th>Completed At</th><th>Score</th><th>Percent</th><th>Time</th></tr>')
-        for r in rows:
-            html.append('<tr>' + ''.join(f'<td>{(x or "")}</td>' for x in r) + '</tr>')
-        html.append('</table></body></html>')
-        bio = io.BytesIO()
-        bio.write('\n'.join(html).encode('utf-8'))
-        bio.seek(0)
-        filename = f"{(student.name or 'student').replace(' ', '_')}_attempts.doc"
-        return send_file(bio, as_attachment=True, download_name=filename, mimetype='application/msword')
+        base = (student.name or 'student').replace(' ', '_')
+        # Prefer python-docx for a proper .docx when available; otherwise a simple
+        # HTML document with .doc extension, which Word can open
+        if importlib.util.find_spec('docx') is not None:
+            job_id = export_jobs.submit('attempts_docx', [rows, student.name], f"{base}_attempts.docx", 'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        else:
+            job_id = export_jobs.submit('attempts_doc', [rows, student.name], f"{base}_attempts.doc", 'application/msword')
+        return _export_job_response(job_id)
 
     flash('Unknown export format.', 'error')
     return redirect(url_for('main.teacher_view_student', student_id=student_id))
 
 @main.route("/teacher/messages")
 def teacher_messages():
-    # list conversations for this teacher (show student names and unread counts)
+    # list conversations for this teacher (student names, last message and unread counts)
     teacher_id = session.get('teacher_id')
-    conversations = []
+    page = request.args.get('page', 1, type=int)
+    conversations, has_more = [], False
     if teacher_id:
-        convs = Conversation.query.filter_by(teacher_id=teacher_id).order_by(Conversation.created_at.desc()).all()
-        for c in convs:
-            # last message snippet & unread count
-            last = None
-            unread = 0
-            if c.messages:
-                last = c.messages[-1]
-                unread = Message.query.filter(Message.conversation_id == c.id, Message.sender_role == 'student', Message.read == False).count()
-            conversations.append({'id': c.id, 'student': c.student, 'last': last, 'unread': unread})
-    # also provide a list of students to start a new conversation
-    students = Student.query.order_by(Student.name.asc()).all()
-    return render_template("teacher/messages.html", conversations=conversations, students=students)
+        conversations, has_more = inbox_page('teacher', teacher_id, page)
+    return render_template("teacher/messages.html", conversations=conversations, page=page, has_more=has_more)
 
 
 @main.route("/student/messages")
 def student_messages():
     # list conversations for this student
     student_id = session.get('student_id')
-    conversations = []
+    page = request.args.get('page', 1, type=int)
+    conversations, has_more = [], False
     if student_id:
-        convs = Conversation.query.filter_by(student_id=student_id).order_by(Conversation.created_at.desc()).all()
-        for c in convs:
-            last = None
-            unread = 0
-            if c.messages:
-                last = c.messages[-1]
-                unread = Message.query.filter(Message.conversation_id == c.id, Message.sender_role == 'teacher', Message.read == False).count()
-            conversations.append({'id': c.id, 'teacher': c.teacher, 'last': last, 'unread': unread})
-    # include list of teachers for starting a new conversation
-    teachers = Teacher.query.order_by(Teacher.name.asc()).all()
-    return render_template('student/messages.html', conversations=conversations, teachers=teachers)
+        conversations, has_more = inbox_page('student', student_id, page)
+    return render_template('student/messages.html', conversations=conversations, page=page, has_more=has_more)
 
 
-# API: fetch messages for a conversation
+# API: fetch messages for a conversation, one page at a time
+# Usage: /api/messages/<id>?limit=50            latest page
+#        /api/messages/<id>?before_id=<id>      older page (scrolling up)
+#        /api/messages/<id>?after_id=<id>       newer messages
 @main.route('/api/messages/<int:conversation_id>')
+@validated(lambda conversation_id: broker.latest_event_id(conversation_id))
 def api_get_messages(conversation_id):
     conv = Conversation.query.filter_by(id=conversation_id).first()
     if not conv:
         return jsonify({'error': 'Conversation not found'}), 404
-    msgs = []
-    for m in conv.messages:
-        msgs.append({'id': m.id, 'sender_role': m.sender_role, 'sender_id': m.sender_id, 'text': m.text, 'created_at': m.created_at.isoformat(), 'read': m.read})
-    return jsonify({'conversation_id': conv.id, 'messages': msgs})
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+
+    # taken before reading the messages so a stream started from it misses nothing
+    last_event_id = broker.latest_event_id(conv.id)
+    # walks the (conversation_id, id) index; fetch one extra row to know if more exist
+    query = Message.query.filter(Message.conversation_id == conv.id)
+    if after_id is not None:
+        rows = query.filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+        rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+
+    msgs = [_message_dict(m) for m in rows]
+    return jsonify({
+        'conversation_id': conv.id,
+        'messages': msgs,
+        'has_more': has_more,
+        'oldest_id': rows[0].id if rows else None,
+        'newest_id': rows[-1].id if rows else None,
+        'last_event_id': last_event_id,
+    })
+
+
+def _message_dict(m):
+    return {'id': m.id, 'sender_role': m.sender_role, 'sender_id': m.sender_id, 'text': m.text, 'created_at': m.created_at.isoformat(), 'read': m.read}
+
+
+# API: push new messages and read receipts of a conversation as server-sent events
+@main.route('/api/messages/<int:conversation_id>/stream')
+def api_stream_messages(conversation_id):
+    conv = Conversation.query.filter_by(id=conversation_id).first()
+    if not conv:
+        return jsonify({'error': 'Conversation not found'}), 404
+    teacher_id = session.get('teacher_id')
+    student_id = session.get('student_id')
+    if not ((teacher_id and conv.teacher_id == teacher_id) or (student_id and conv.student_id == student_id)):
+        return jsonify({'error': 'Not a participant'}), 403
+
+    # resume after the last event the client saw (EventSource sends Last-Event-ID on reconnect)
+    after = request.headers.get('Last-Event-ID', type=int)
+    if after is None:
+        after = request.args.get('after', type=int)
+    if after is None:
+        after = broker.latest_event_id(conversation_id)
+    poll_seconds = current_app.config.get('MESSAGE_STREAM_POLL_SECONDS', 2)
+    # 0: answer with the pending events and end the response (polling through
+    # EventSource's reconnect); longer streams need threaded or async workers
+    max_seconds = current_app.config.get('MESSAGE_STREAM_MAX_SECONDS', 0)
+
+    def generate():
+        last_id = after
+        started = last_sent = time.monotonic()
+        # how soon the browser reconnects once this response ends
+        yield f'retry: {int(poll_seconds * 1000)}\n\n'
+        while True:
+            events = broker.events_after(conversation_id, last_id)
+            chunks = [broker.format_sse(event) for event in events]
+            if events:
+                last_id = events[-1].id
+            # hand the connection back to the pool while waiting; the next poll
+            # starts a new transaction and sees newly committed events
+            db.session.remove()
+            for chunk in chunks:
+                yield chunk
+            now = time.monotonic()
+            if now - started >= max_seconds:
+                break
+            if events:
+                last_sent = now
+                continue
+            if now - last_sent >= 15:
+                yield ': keepalive\n\n'
+                last_sent = now
+            broker.wait(poll_seconds)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # API: send a message (creates conversation if needed)
@@ -974,7 +865,10 @@ def api_send_message():
     try:
         msg = Message(conversation_id=conv.id, sender_role=sender_role, sender_id=sender_id, text=text)
         db.session.add(msg)
+        db.session.flush()
+        broker.publish(conv.id, 'message', _message_dict(msg))
         db.session.commit()
+        broker.notify()
         return jsonify({'status': 'ok', 'message_id': msg.id, 'conversation_id': conv.id}), 201
     except Exception as e:
         db.session.rollback()
@@ -993,12 +887,18 @@ def api_mark_read(conversation_id):
     # mark messages sent by the opposite role as read
     try:
         if teacher_id and conv.teacher_id == teacher_id:
-            Message.query.filter(Message.conversation_id == conv.id, Message.sender_role == 'student', Message.read == False).update({'read': True})
+            reader_role, sender_role = 'teacher', 'student'
         elif student_id and conv.student_id == student_id:
-            Message.query.filter(Message.conversation_id == conv.id, Message.sender_role == 'teacher', Message.read == False).update({'read': True})
+            reader_role, sender_role = 'student', 'teacher'
         else:
             return jsonify({'error': 'Not a participant'}), 403
+        updated = Message.query.filter(Message.conversation_id == conv.id, Message.sender_role == sender_role, Message.read == False).update({'read': True})
+        if updated:
+            # read receipt for the other participant's stream
+            broker.publish(conv.id, 'read', {'reader_role': reader_role, 'sender_role': sender_role})
         db.session.commit()
+        if updated:
+            broker.notify()
         return jsonify({'status': 'ok'})
     except Exception as e:
         db.session.rollback()
@@ -1033,68 +933,15 @@ def api_get_or_create_conversation():
 
 @main.route("/teacher/analytics")
 def teacher_analytics():
-    # Build a simple performance trend: average percent across all students
-    # for the last 6 months (including current month). We'll compute month buckets
-    # and average the QuizAttempt.percent for completed attempts in each month.
-    trend_subjects = []  # Placeholder for future subject trends
+    # Performance trend: average percent across all students per calendar month
+    # (or week) in one grouped query. Usage: /teacher/analytics?period=month|week&n=12
+    period, n = parse_range(request.args)
     try:
-        now = datetime.utcnow()
-        # prepare 6 months range (including current month)
-        months = []
-        for i in range(5, -1, -1):
-            m = (now - timedelta(days=30 * i))
-            months.append((m.year, m.month))
-
-        # build month labels and start/end datetimes for each bucket
-        buckets = []
-        labels = []
-        for y, mo in months:
-            labels.append(datetime(y, mo, 1).strftime('%b'))
-            start = datetime(y, mo, 1)
-            # compute end as first day of next month
-            if mo == 12:
-                end = datetime(y + 1, 1, 1)
-            else:
-                end = datetime(y, mo + 1, 1)
-            buckets.append((start, end))
-
-        avg_percents = []
-        for start, end in buckets:
-            val = (
-                db.session.query(func.avg(QuizAttempt.percent))
-                .filter(QuizAttempt.completed_at != None, QuizAttempt.completed_at >= start, QuizAttempt.completed_at < end, QuizAttempt.percent != None)
-                .scalar()
-            )
-            try:
-                if val is None:
-                    avg_percents.append(None)
-                else:
-                    avg_percents.append(round(float(val), 1))
-            except Exception:
-                avg_percents.append(None)
-
-        # Convert averages into SVG coordinates for the existing 600x220 viewBox
-        # y-axis: 20..180 maps to 100..0 (percent -> pixel)
-        # x positions: spread evenly between 60 and 560
-        xs = [60 + i * 100 for i in range(len(avg_percents))]
-        points = []
-        circles = []
-        for i, v in enumerate(avg_percents):
-            x = xs[i]
-            if v is None:
-                # place missing points at bottom (or skip)
-                y = 180
-            else:
-                # percent 100 -> y=20, 0 -> y=180
-                y = 20 + (100 - max(0, min(100, v))) * (160 / 100.0)
-            points.append((x, int(y)))
-            circles.append({'x': x, 'y': int(y), 'label': (str(v) + '%' if v is not None else 'n/a')})
-
-        # build polyline points string skipping trailing None values to avoid drops
-        points_str = ' '.join(f"{p[0]},{p[1]}" for p in points)
-
+        trend = performance_trend(period, n)
+        points_str, circles, labels = trend_chart(trend, period)
     except Exception:
-        labels = ['Jan','Feb','Mar','Apr','May','Jun']
+        db.session.rollback()
+        labels = [{'x': 60 + i * 100, 'text': m} for i, m in enumerate(['Jan','Feb','Mar','Apr','May','Jun'])]
         points_str = "60,120 160,90 260,80 360,90 460,70 560,80"
         circles = [
             {'x':60,'y':120,'label':'80%'},
@@ -1104,58 +951,15 @@ def teacher_analytics():
             {'x':460,'y':70,'label':'95%'},
             {'x':560,'y':80,'label':'93%'},
         ]
-    # compute per-subject average percent (all students) for subject performance card
-    try:
-        subj_rows = (
-            db.session.query(
-                Subject.name.label('subject_name'),
-                func.avg(QuizAttempt.percent).label('avg_percent'),
-                func.count(QuizAttempt.id).label('attempts_count')
-            )
-            .join(Quiz, Quiz.subject_id == Subject.id)
-            .join(QuizAttempt, QuizAttempt.quiz_id == Quiz.id)
-            .filter(QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-            .group_by(Subject.id)
-            .order_by(func.avg(QuizAttempt.percent).desc())
-            .all()
-        )
-        trend_subjects = []
-        for r in subj_rows:
-            try:
-                avg = round(float(r.avg_percent), 1) if r.avg_percent is not None else None
-            except Exception:
-                avg = None
-            trend_subjects.append({'name': r.subject_name, 'avg_percent': avg, 'attempts': int(r.attempts_count)})
-    except Exception:
-        trend_subjects = []
 
-    # compute per-quiz average percent (all students) for quiz performance card
+    # subject and quiz performance cards come from the same per-quiz aggregate
     try:
-        quiz_rows = (
-            db.session.query(
-                Quiz.id.label('quiz_id'),
-                Quiz.title.label('quiz_title'),
-                func.avg(QuizAttempt.percent).label('avg_percent'),
-                func.count(QuizAttempt.id).label('attempts_count')
-            )
-            .join(QuizAttempt, QuizAttempt.quiz_id == Quiz.id)
-            .filter(QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-            .group_by(Quiz.id)
-            .order_by(func.avg(QuizAttempt.percent).desc())
-            .limit(6)
-            .all()
-        )
-        trend_quizzes = []
-        for q in quiz_rows:
-            try:
-                avgq = round(float(q.avg_percent), 1) if q.avg_percent is not None else None
-            except Exception:
-                avgq = None
-            trend_quizzes.append({'id': q.quiz_id, 'title': q.quiz_title, 'avg_percent': avgq, 'attempts': int(q.attempts_count)})
+        trend_subjects, trend_quizzes = performance_cards(quiz_limit=6)
     except Exception:
-        trend_quizzes = []
+        db.session.rollback()
+        trend_subjects, trend_quizzes = [], []
 
-    return render_template("teacher/analytics.html", trend_points=points_str, trend_circles=circles, trend_labels=labels, trend_subjects=trend_subjects, trend_quizzes=trend_quizzes)
+    return render_template("teacher/analytics.html", trend_points=points_str, trend_circles=circles, trend_labels=labels, trend_subjects=trend_subjects, trend_quizzes=trend_quizzes, trend_period=period, trend_n=n, trend_ranges=TREND_RANGES)
 
 @main.route("/teacher/settings")
 def teacher_settings():
@@ -1191,6 +995,8 @@ def teacher_update_info():
 
     teacher.name = name
     teacher.email = email
+    # teacher names are listed in the quiz catalog
+    bump(CATALOG)
     db.session.commit()
     flash('Profile updated successfully.', 'success')
     return redirect(url_for('main.teacher_settings'))
@@ -1244,6 +1050,7 @@ def teacher_delete_account():
 
     # delete teacher and logout
     db.session.delete(teacher)
+    bump(CATALOG)
     db.session.commit()
     session.clear()
     flash('Your account has been deleted.', 'success')
@@ -1264,10 +1071,13 @@ def teacher_edit_quiz(quiz_id):
 
     # POST: update quiz
     data = request.get_json() or request.form
+    # new content version: cached answer keys for the old one are no longer used
+    quiz.version = (quiz.version or 1) + 1
     quiz.title = data.get('title', quiz.title)
     quiz.description = data.get('description', quiz.description)
     quiz.time_limit = int(data.get('time_limit', quiz.time_limit))
     quiz.difficulty = data.get('difficulty', quiz.difficulty)
+    old_subject_id = quiz.subject_id
     subject_name = data.get('subject')
     if subject_name:
         subject = Subject.query.filter_by(name=subject_name).first()
@@ -1276,36 +1086,32 @@ def teacher_edit_quiz(quiz_id):
             db.session.add(subject)
             db.session.flush()
         quiz.subject = subject
+        if subject.id != old_subject_id:
+            # the students' past attempts now count towards the new subject
+            db.session.flush()
+            rebuild_subject_stats(quiz_students(quiz.id))
+            rebuild_rollups(quiz_days(quiz.id), models=[DailySubjectStats])
 
-    # Update questions
-    questions = data.get('questions', [])
-    # Remove old questions/options
-    for q in quiz.questions:
-        for opt in q.options:
-            db.session.delete(opt)
-        db.session.delete(q)
-    db.session.flush()
-
-    # Add new questions/options
-    for q in questions:
-        qtype = q.get('type')
-        qtext = q.get('text')
-        correct = q.get('correct')
-        opts = q.get('options', [])
-        question = Question(quiz=quiz, type=qtype, text=qtext, correct_answer=str(correct))
-        db.session.add(question)
-        db.session.flush()
-        if qtype == 'mc':
-            for opt in opts:
-                key = opt.get('key')
-                text = opt.get('text')
-                if key and text is not None:
-                    option = Option(question=question, key=key, text=text)
-                    db.session.add(option)
+    # Update questions in place (a form post without questions leaves them alone)
+    changes = None
+    if 'questions' in data:
+        try:
+            changes = sync_questions(quiz, data.get('questions') or [])
+        except ValueError as e:
+            db.session.rollback()
+            if request.is_json:
+                return jsonify({"error": str(e)}), 400
+            flash(str(e), "error")
+            return redirect(url_for('main.teacher_edit_quiz', quiz_id=quiz_id))
+    search_index.index([quiz.id])
+    publish_delivery([quiz.id])
+    bump(CATALOG)
 
     db.session.commit()
+    # the subject may have changed
+    dashboard_cache.invalidate(teacher_id)
     if request.is_json:
-        return jsonify({"status": "success", "quiz_id": quiz.id}), 200
+        return jsonify({"status": "success", "quiz_id": quiz.id, "questions": changes}), 200
     else:
         flash("Quiz updated successfully!", "success")
         return redirect(url_for('main.teacher_quizzes'))
@@ -1328,14 +1134,30 @@ def teacher_delete_quiz(quiz_id):
         # deletes to avoid SQLAlchemy emitting UPDATEs that set quiz_id=NULL
         # which violates the NOT NULL constraint in SQLite.
         attempt_ids = [r.id for r in QuizAttempt.query.with_entities(QuizAttempt.id).filter_by(quiz_id=quiz.id).all()]
+        # days whose analytics rollups include this quiz's attempts
+        rollup_days = quiz_days(quiz.id)
+        # students whose summaries (and leaderboard averages) count these attempts
+        student_ids = quiz_students(quiz.id)
         if attempt_ids:
-            # delete answers for those attempts
+            # delete answers and journal receipts for those attempts
             AttemptAnswer.query.filter(AttemptAnswer.attempt_id.in_(attempt_ids)).delete(synchronize_session=False)
+            SubmissionReceipt.query.filter(SubmissionReceipt.attempt_id.in_(attempt_ids)).delete(synchronize_session=False)
             # delete attempts themselves
             QuizAttempt.query.filter(QuizAttempt.id.in_(attempt_ids)).delete(synchronize_session=False)
-        # finally delete the quiz
+        for student_id in student_ids:
+            rebuild_student_stats(student_id)
+        # the rows referencing the quiz (delivery payload, daily quiz rollups) go
+        # before the quiz itself: with foreign keys enforced (PostgreSQL) the
+        # queries below would otherwise autoflush a DELETE of the quiz that fails
+        withdraw_delivery(quiz_id)
+        rebuild_rollups(rollup_days)
+        search_index.remove([quiz_id])
+        bump(CATALOG)
+        # finally delete the quiz (its questions and options cascade)
         db.session.delete(quiz)
         db.session.commit()
+        answer_keys.invalidate(quiz_id)
+        dashboard_cache.invalidate(teacher_id)
         return jsonify({'status': 'ok'}), 200
     except Exception as e:
         db.session.rollback()
@@ -1347,6 +1169,8 @@ def student_progress():
     student_id = session.get('student_id')
     attempts = []
     if student_id:
+        # make sure this student's own journaled submissions are visible
+        submission_journal.settle(student_id)
         # load recent attempts for this student (most recent first)
         attempts = (
             QuizAttempt.query.filter_by(student_id=student_id)
@@ -1365,14 +1189,9 @@ def student_progress():
                     goal = int(s.weekly_goal)
                 except Exception:
                     goal = 5
-        now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
         completed_this_week = 0
         if student_id:
-            completed_this_week = (
-                QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.completed_at >= week_start)
-                .count()
-            )
+            completed_this_week = summarize(get_student_stats(student_id))['completed_this_week']
 
         percent = int((completed_this_week / goal) * 100) if goal > 0 else 0
         if percent > 100:
@@ -1390,27 +1209,7 @@ def student_progress():
     subject_strengths = []
     if student_id:
         try:
-            rows = (
-                db.session.query(
-                    Subject.id.label('subject_id'),
-                    Subject.name.label('subject_name'),
-                    func.avg(QuizAttempt.percent).label('avg_percent'),
-                    func.count(QuizAttempt.id).label('attempts_count')
-                )
-                .join(Quiz, Quiz.subject_id == Subject.id)
-                .join(QuizAttempt, QuizAttempt.quiz_id == Quiz.id)
-                .filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-                .group_by(Subject.id)
-                .order_by(func.avg(QuizAttempt.percent).desc())
-                .all()
-            )
-            for r in rows:
-                subject_strengths.append({
-                    'id': r.subject_id,
-                    'name': r.subject_name,
-                    'avg_percent': round(float(r.avg_percent), 1) if r.avg_percent is not None else 0.0,
-                    'attempts': int(r.attempts_count),
-                })
+            subject_strengths = load_subject_strengths(student_id)
         except Exception:
             subject_strengths = []
 
@@ -1429,55 +1228,19 @@ def student_ranking():
     # compute average percent score per student across completed attempts
     # and sort highest to lowest. Also determine the logged-in student's rank.
     student_id = session.get('student_id')
+    if student_id:
+        submission_journal.settle(student_id)
 
-    # Build a query that returns student id, name, average percent and count of attempts
+    # read the top of the board and the student's dense rank from the incremental leaderboard
     try:
-        # join Student and QuizAttempt, aggregate by student
-        averages = (
-            db.session.query(
-                Student.id.label('student_id'),
-                Student.name.label('name'),
-                func.avg(QuizAttempt.percent).label('avg_percent'),
-                func.count(QuizAttempt.id).label('attempts_count'),
-            )
-            .join(QuizAttempt, QuizAttempt.student_id == Student.id)
-            .filter(QuizAttempt.completed_at != None, QuizAttempt.percent != None)
-            .group_by(Student.id)
-            .order_by(func.avg(QuizAttempt.percent).desc())
-            .all()
-        )
-
-        # Convert to list of dicts and assign rank numbers (1-based). Handle ties by dense ranking.
-        ranked = []
-        last_score = None
-        current_rank = 0
-        dense_rank = 0
-        for row in averages:
-            avg = float(row.avg_percent) if row.avg_percent is not None else 0.0
-            # increment dense rank when score differs
-            if last_score is None or avg != last_score:
-                dense_rank = dense_rank + 1
-            last_score = avg
-            ranked.append({
-                'rank': dense_rank,
-                'student_id': row.student_id,
-                'name': row.name,
-                'avg_percent': round(avg, 1),
-                'attempts_count': int(row.attempts_count),
-            })
-
-        # find current student's rank if logged in
+        leaderboard.sync()
+        top_students = leaderboard.top(5)
         current_student_rank = None
         current_student_avg = None
         if student_id:
-            for s in ranked:
-                if s['student_id'] == student_id:
-                    current_student_rank = s['rank']
-                    current_student_avg = s['avg_percent']
-                    break
-
+            current_student_rank, current_student_avg = leaderboard.rank_of(student_id)
     except Exception:
-        ranked = []
+        top_students = []
         current_student_rank = None
         current_student_avg = None
 
@@ -1489,19 +1252,14 @@ def student_ranking():
             s = Student.query.filter_by(id=student_id).first()
             if s:
                 current_student_name = s.name
-                current_student_attempts = (
-                    QuizAttempt.query.filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None).count()
-                )
+                current_student_attempts = summarize(get_student_stats(student_id))['quizzes_taken']
     except Exception:
         current_student_name = current_student_name
         current_student_attempts = current_student_attempts
 
-    # pass top 5 and full ranked list to template
-    top_students = ranked[:5]
     return render_template(
         "student/ranking.html",
         top_students=top_students,
-        ranked_students=ranked,
         current_student_rank=current_student_rank,
         current_student_avg=current_student_avg,
         current_student_id=student_id,
@@ -1597,6 +1355,7 @@ def student_delete_account():
 
     # delete student and logout
     db.session.delete(student)
+    bump(STUDENTS)
     db.session.commit()
     session.clear()
     flash('Your account has been deleted.', 'success')
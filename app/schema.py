@@ -0,0 +1,94 @@
+"""Database schema at startup.
+
+The schema is owned by the Alembic revisions in ``migrations/``. With
+CREATE_TABLES_ON_STARTUP on (the default) every worker runs the pending revisions
+when it starts, so an empty database is set up and a database created by an older
+release gets the columns and indexes added since (``db.create_all()`` only creates
+missing tables, never columns of existing ones). Workers take a file lock first so
+only one of them migrates at a time; the others then find the database at head.
+
+With CREATE_TABLES_ON_STARTUP=0 the deploy step runs ``flask --app run db upgrade``;
+a worker started against an out-of-date database logs an error saying so.
+"""
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks
+    fcntl = None
+
+from .models import db
+
+log = logging.getLogger(__name__)
+
+LOCK_FILE = ".migrate.lock"
+
+
+def migrations_dir(app):
+    return os.path.join(os.path.dirname(app.root_path), "migrations")
+
+
+def _revisions(app):
+    """(current revision of the database, head revision of the scripts)."""
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", migrations_dir(app))
+    head = ScriptDirectory.from_config(config).get_current_head()
+    with db.engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    return current, head
+
+
+def upgrade(app):
+    """Run the pending revisions, one worker at a time."""
+    from flask_migrate import upgrade as run_upgrade
+
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, LOCK_FILE), "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            with app.app_context():
+                current, head = _revisions(app)
+                if current != head:
+                    run_upgrade(directory=migrations_dir(app))
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def init_app(app):
+    try:
+        from flask_migrate import Migrate
+    except ImportError:
+        Migrate = None
+
+    if Migrate is None:
+        # no Alembic: fall back to creating the missing tables
+        if app.config.get("CREATE_TABLES_ON_STARTUP", True):
+            with app.app_context():
+                db.create_all()
+        return
+
+    # `flask db upgrade` / `flask db migrate`
+    Migrate(app, db, render_as_batch=True, directory=migrations_dir(app))
+
+    if app.config.get("CREATE_TABLES_ON_STARTUP", True):
+        upgrade(app)
+        return
+
+    with app.app_context():
+        try:
+            current, head = _revisions(app)
+        except Exception:
+            log.exception("could not read the database schema revision")
+            return
+    if current != head:
+        log.error(
+            "database schema is at revision %s, the code expects %s: run `flask --app run db upgrade`",
+            current, head,
+        )
@@ -0,0 +1,191 @@
+"""Server-side quiz search.
+
+On SQLite the catalog is indexed in an FTS5 table, ``quiz_search``, with one row per
+quiz (rowid = quiz id) holding its title, description, subject name and the text of
+all its questions. Searches are a MATCH on that table ranked with bm25 (title
+matches weigh most, then subject, description and question text). The create, edit,
+delete and import paths re-index the quizzes they touch in the same transaction;
+``flask rebuild-search-index`` rebuilds the table from scratch.
+
+Other backends (and SQLite builds without FTS5) fall back to matching every search
+term with ILIKE against the same fields and ranking by a weighted count of the
+fields that matched.
+"""
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, case, or_, exists, table, column, literal_column, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from .models import db, Quiz, Question, Subject
+from .catalog import question_count, DEFAULT_PAGE_SIZE
+
+FTS_TABLE = 'quiz_search'
+CREATE_FTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, subject, questions, tokenize = 'porter unicode61 remove_diacritics 2')"
+)
+fts_table = table(FTS_TABLE, column('rowid'))
+# bm25 column weights: title, description, subject, questions
+WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+# terms of a search beyond this are ignored
+MAX_TERMS = 8
+# quiz ids per DELETE/INSERT statement when re-indexing
+CHUNK = 500
+
+
+class SearchIndex:
+    def __init__(self):
+        self.fts = False
+
+    def init_app(self, app):
+        app.cli.add_command(rebuild_search_index_command)
+        if not app.config.get("CREATE_TABLES_ON_STARTUP", True):
+            # the table is created by `flask rebuild-search-index`
+            with app.app_context():
+                self.fts = self._has_table()
+            return
+        with app.app_context():
+            self.fts = self.create()
+            if self.fts:
+                indexed = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+                if not indexed and db.session.query(Quiz.id).first() is not None:
+                    self.rebuild()
+                db.session.commit()
+
+    def _has_table(self):
+        if db.engine.dialect.name != 'sqlite':
+            return False
+        found = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        return found is not None
+
+    def create(self):
+        """Create the FTS5 table if this is SQLite with FTS5; returns whether it exists."""
+        if db.engine.dialect.name != 'sqlite':
+            return False
+        try:
+            db.session.execute(text(CREATE_FTS))
+            db.session.commit()
+        except OperationalError:
+            # SQLite compiled without FTS5
+            db.session.rollback()
+            return False
+        return True
+
+    # -- maintenance (caller commits) ------------------------------------------
+
+    def _insert(self, where=''):
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, subject, questions) "
+            "SELECT quiz.id, quiz.title, coalesce(quiz.description, ''), coalesce(subject.name, ''), "
+            "coalesce((SELECT group_concat(question.text, ' ') FROM question WHERE question.quiz_id = quiz.id), '') "
+            "FROM quiz LEFT OUTER JOIN subject ON subject.id = quiz.subject_id " + where
+        ))
+
+    def index(self, quiz_ids):
+        """(Re-)index the given quizzes; quizzes that no longer exist are dropped."""
+        if not self.fts:
+            return
+        ids = sorted({int(i) for i in quiz_ids})
+        # pending questions must be visible to the INSERT ... SELECT
+        db.session.flush()
+        for start in range(0, len(ids), CHUNK):
+            chunk = ', '.join(str(i) for i in ids[start:start + CHUNK])
+            db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({chunk})"))
+            self._insert(f"WHERE quiz.id IN ({chunk})")
+
+    def remove(self, quiz_ids):
+        if not self.fts:
+            return
+        ids = sorted({int(i) for i in quiz_ids})
+        for start in range(0, len(ids), CHUNK):
+            chunk = ', '.join(str(i) for i in ids[start:start + CHUNK])
+            db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({chunk})"))
+
+    def rebuild(self):
+        if not self.fts:
+            return
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        self._insert()
+
+    # -- queries ---------------------------------------------------------------
+
+    def search_page(self, filters):
+        """Return (rows, next_offset): (quiz, question_count) rows ranked by relevance."""
+        terms = search_terms(filters.get('q'))
+        limit = filters.get('limit') or DEFAULT_PAGE_SIZE
+        offset = filters.get('offset') or 0
+        if not terms:
+            return [], None
+        query = (
+            db.session.query(Quiz, question_count())
+            .options(joinedload(Quiz.subject), joinedload(Quiz.teacher))
+        )
+        if self.fts:
+            query = (
+                query.join(fts_table, fts_table.c.rowid == Quiz.id)
+                .filter(literal_column(FTS_TABLE).match(match_expression(terms)))
+                .order_by(func.bm25(literal_column(FTS_TABLE), *WEIGHTS), Quiz.id.desc())
+            )
+        else:
+            query = query.outerjoin(Subject, Subject.id == Quiz.subject_id)
+            score = 0
+            for term in terms:
+                like = f'%{term}%'
+                fields = (
+                    (Quiz.title.ilike(like), 4),
+                    (Subject.name.ilike(like), 2),
+                    (Quiz.description.ilike(like), 1),
+                    (exists().where(Question.quiz_id == Quiz.id, Question.text.ilike(like)), 1),
+                )
+                query = query.filter(or_(*(cond for cond, _ in fields)))
+                score = score + sum(case((cond, weight), else_=0) for cond, weight in fields)
+            query = query.order_by(score.desc(), Quiz.id.desc())
+        if filters.get('subject_id'):
+            query = query.filter(Quiz.subject_id == filters['subject_id'])
+        if filters.get('teacher_id'):
+            query = query.filter(Quiz.teacher_id == filters['teacher_id'])
+        if filters.get('difficulty'):
+            query = query.filter(Quiz.difficulty == filters['difficulty'])
+
+        rows = query.offset(offset).limit(limit + 1).all()
+        next_offset = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_offset = offset + limit
+        return rows, next_offset
+
+
+def search_terms(q):
+    """Lower-cased word terms of a search string (punctuation and FTS syntax dropped)."""
+    return re.findall(r'\w+', (q or '').lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    # every term must match, each as a prefix ("irrig" finds "irrigation")
+    return ' '.join(f'"{t}"*' for t in terms)
+
+
+search_index = SearchIndex()
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Create (if needed) and rebuild the quiz full-text search index."""
+    search_index.fts = search_index.create()
+    if not search_index.fts:
+        click.echo('Full-text search needs SQLite with FTS5; searches use the ILIKE fallback.')
+        return
+    search_index.rebuild()
+    db.session.commit()
+    count = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+    click.echo(f'Indexed {count} quizzes.')
+
+
+def init_app(app):
+    search_index.init_app(app)
@@ -0,0 +1,307 @@
+"""Materialized per-student statistics.
+
+The dashboards used to aggregate the whole QuizAttempt history on every page view.
+`record_attempt` folds a new attempt into the StudentStats / StudentSubjectStats rows
+inside the same transaction that inserts the QuizAttempt, and `get_student_stats`
+reads the summary back (rebuilding it once from the history if it does not exist yet).
+Students with attempts from before the summaries existed are backfilled at startup
+(when the table is still empty) or with ``flask backfill-student-stats``.
+"""
+from datetime import datetime, timedelta, time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, case, Date
+
+from .models import db, Quiz, Subject, QuizAttempt, StudentStats, StudentSubjectStats
+
+# student ids per statement when rebuilding summaries in bulk
+CHUNK = 500
+
+
+def week_start(day):
+    """Return the Monday of the ISO week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def increment(model, keys, increments):
+    """Add `increments` to the counters of the `model` row with primary key `keys`,
+    inserting the row if it does not exist yet (caller commits).
+
+    On PostgreSQL and SQLite this is one INSERT ... ON CONFLICT DO UPDATE, so two
+    workers creating the same row at once cannot fail on the primary key.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in increments},
+        )
+        db.session.execute(stmt)
+        return
+    updated = (
+        db.session.query(model)
+        .filter_by(**keys)
+        .update({table.c[name]: table.c[name] + value for name, value in increments.items()}, synchronize_session=False)
+    )
+    if not updated:
+        db.session.add(model(**keys, **increments))
+
+
+def record_attempt(student_id, subject_id, percent, time_taken_seconds, completed_at):
+    """Update the summary rows for a freshly added attempt (caller commits).
+
+    The counters are advanced with a single UPDATE so two submissions racing for the
+    same student cannot lose an increment. If the student has no summary yet it is
+    rebuilt from the attempt history, which already includes the new attempt.
+    """
+    today = completed_at.date()
+    monday = week_start(today)
+    seconds = int(time_taken_seconds) if isinstance(time_taken_seconds, (int, float)) else 0
+
+    S = StudentStats
+    # same day keeps the streak, the day after extends it, any gap restarts it; an
+    # attempt older than the last active day (late write) leaves the state alone
+    streak = case(
+        (S.last_active_day >= today, S.current_streak),
+        (S.last_active_day == today - timedelta(days=1), S.current_streak + 1),
+        else_=1,
+    )
+    values = {
+        S.attempts_count: S.attempts_count + 1,
+        S.time_sum: S.time_sum + seconds,
+        S.last_completed_at: completed_at,
+        S.current_streak: streak,
+        S.longest_streak: case((streak > S.longest_streak, streak), else_=S.longest_streak),
+        S.last_active_day: case((S.last_active_day > today, S.last_active_day), else_=today),
+        S.day_count: case((S.day_window == today, S.day_count + 1), (S.day_window > today, S.day_count), else_=1),
+        S.day_window: case((S.day_window > today, S.day_window), else_=today),
+        S.week_count: case((S.week_window == monday, S.week_count + 1), (S.week_window > monday, S.week_count), else_=1),
+        S.week_window: case((S.week_window > monday, S.week_window), else_=monday),
+        # write time, the leaderboard's sync watermark (completed_at can be older:
+        # journaled attempts are written late)
+        S.updated_at: datetime.utcnow(),
+    }
+    if percent is not None:
+        values[S.percent_sum] = S.percent_sum + float(percent)
+        values[S.percent_count] = S.percent_count + 1
+
+    updated = db.session.query(S).filter(S.student_id == student_id).update(values, synchronize_session=False)
+    if not updated:
+        rebuild_student_stats(student_id, now=completed_at)
+        return
+
+    if subject_id is not None and percent is not None:
+        increment(
+            StudentSubjectStats,
+            {'student_id': student_id, 'subject_id': subject_id},
+            {'attempts_count': 1, 'percent_sum': float(percent)},
+        )
+
+
+def rebuild_student_stats(student_id, now=None):
+    """Recompute a student's summary rows from QuizAttempt (caller commits)."""
+    now = now or datetime.utcnow()
+    today = now.date()
+    monday = week_start(today)
+    completed = (QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None)
+
+    row = (
+        db.session.query(
+            func.count(QuizAttempt.id),
+            func.sum(QuizAttempt.percent),
+            func.count(QuizAttempt.percent),
+            func.sum(QuizAttempt.time_taken_seconds),
+            func.max(QuizAttempt.completed_at),
+            func.count(case((QuizAttempt.completed_at >= datetime.combine(today, time.min), 1))),
+            func.count(case((QuizAttempt.completed_at >= datetime.combine(monday, time.min), 1))),
+        )
+        .filter(*completed)
+        .one()
+    )
+
+    stats = db.session.get(StudentStats, student_id)
+    if stats is None:
+        stats = StudentStats(student_id=student_id)
+        db.session.add(stats)
+    stats.attempts_count = int(row[0] or 0)
+    stats.percent_sum = float(row[1] or 0.0)
+    stats.percent_count = int(row[2] or 0)
+    stats.time_sum = int(row[3] or 0)
+    stats.last_completed_at = row[4]
+    stats.day_window = today
+    stats.day_count = int(row[5] or 0)
+    stats.week_window = monday
+    stats.week_count = int(row[6] or 0)
+    stats.updated_at = datetime.utcnow()
+
+    stats.current_streak, stats.longest_streak, stats.last_active_day = _streaks(student_id)
+
+    db.session.flush()
+    rebuild_subject_stats([student_id])
+    return stats
+
+
+def rebuild_subject_stats(student_ids):
+    """Recompute the per-subject summary rows of `student_ids` (caller commits).
+
+    Used on its own when a quiz moves to another subject: the students' attempts
+    at it then count towards the new subject.
+    """
+    ids = sorted(set(student_ids))
+    for start in range(0, len(ids), CHUNK):
+        chunk = ids[start:start + CHUNK]
+        StudentSubjectStats.query.filter(StudentSubjectStats.student_id.in_(chunk)).delete(synchronize_session=False)
+        source = (
+            db.session.query(QuizAttempt.student_id, Quiz.subject_id, func.count(QuizAttempt.id), func.sum(QuizAttempt.percent))
+            .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+            .filter(
+                QuizAttempt.student_id.in_(chunk), QuizAttempt.completed_at != None,
+                QuizAttempt.percent != None, Quiz.subject_id != None,
+            )
+            .group_by(QuizAttempt.student_id, Quiz.subject_id)
+        )
+        db.session.execute(
+            StudentSubjectStats.__table__.insert().from_select(
+                ['student_id', 'subject_id', 'attempts_count', 'percent_sum'], source.statement,
+            )
+        )
+
+
+def quiz_students(quiz_id):
+    """Ids of the students who have attempted `quiz_id`."""
+    return [
+        student_id for (student_id,) in
+        db.session.query(QuizAttempt.student_id).filter(QuizAttempt.quiz_id == quiz_id).distinct().all()
+    ]
+
+
+def _streaks(student_id):
+    """Return (current, longest, last_active_day) from the distinct completion days.
+
+    Only the distinct days are transferred (one row per active day), never the
+    individual attempt timestamps.
+    """
+    day = func.date(QuizAttempt.completed_at, type_=Date)
+    days = [
+        d for (d,) in db.session.query(day)
+        .filter(QuizAttempt.student_id == student_id, QuizAttempt.completed_at != None)
+        .distinct()
+        .order_by(day)
+        .all()
+        if d is not None
+    ]
+    current = longest = 0
+    previous = None
+    for d in days:
+        current = current + 1 if previous is not None and d - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = d
+    return current, longest, previous
+
+
+def get_student_stats(student_id):
+    """Return the StudentStats row for a student, building it on first use."""
+    stats = db.session.get(StudentStats, student_id)
+    if stats is None:
+        try:
+            stats = rebuild_student_stats(student_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            return None
+    return stats
+
+
+def summarize(stats, now=None):
+    """Turn a StudentStats row into the values the dashboards display."""
+    summary = {
+        'quizzes_taken': 0,
+        'avg_score': None,
+        'days_streak': 0,
+        'longest_streak': 0,
+        'completed_today': 0,
+        'completed_this_week': 0,
+    }
+    if stats is None:
+        return summary
+    today = (now or datetime.utcnow()).date()
+    summary['quizzes_taken'] = stats.attempts_count or 0
+    if stats.percent_count:
+        summary['avg_score'] = round(stats.percent_sum / stats.percent_count, 1)
+    # the streak only counts while it reaches today
+    if stats.last_active_day == today:
+        summary['days_streak'] = stats.current_streak or 0
+    summary['longest_streak'] = stats.longest_streak or 0
+    if stats.day_window == today:
+        summary['completed_today'] = stats.day_count or 0
+    if stats.week_window == week_start(today):
+        summary['completed_this_week'] = stats.week_count or 0
+    return summary
+
+
+def subject_strengths(student_id):
+    """Per-subject averages for a student, strongest first."""
+    avg = StudentSubjectStats.percent_sum / StudentSubjectStats.attempts_count
+    rows = (
+        db.session.query(Subject.id, Subject.name, avg.label('avg_percent'), StudentSubjectStats.attempts_count)
+        .join(Subject, Subject.id == StudentSubjectStats.subject_id)
+        .filter(StudentSubjectStats.student_id == student_id, StudentSubjectStats.attempts_count > 0)
+        .order_by(avg.desc())
+        .all()
+    )
+    strengths = []
+    for r in rows:
+        strengths.append({
+            'id': r[0],
+            'name': r[1],
+            'avg_percent': round(float(r[2]), 1) if r[2] is not None else 0.0,
+            'attempts': int(r[3]),
+        })
+    return strengths
+
+
+def backfill_student_stats():
+    """Build the summary of every student with completed attempts but no StudentStats
+    row; returns how many were built (caller commits)."""
+    missing = (
+        db.session.query(QuizAttempt.student_id)
+        .outerjoin(StudentStats, StudentStats.student_id == QuizAttempt.student_id)
+        .filter(StudentStats.student_id == None, QuizAttempt.completed_at != None)
+        .distinct()
+        .all()
+    )
+    for (student_id,) in missing:
+        rebuild_student_stats(student_id)
+    return len(missing)
+
+
+@click.command('backfill-student-stats')
+@with_appcontext
+def backfill_student_stats_command():
+    """Build the missing per-student summaries from the attempt history."""
+    count = backfill_student_stats()
+    db.session.commit()
+    click.echo(f'Built {count} student summaries.')
+
+
+def init_app(app):
+    app.cli.add_command(backfill_student_stats_command)
+    if not app.config.get("CREATE_TABLES_ON_STARTUP", True):
+        return
+    with app.app_context():
+        # a database from before the summaries existed: build them once here
+        # rather than in the first request that needs a ranking
+        empty = db.session.query(StudentStats.student_id).first() is None
+        if empty and db.session.query(QuizAttempt.id).filter(QuizAttempt.completed_at != None).first() is not None:
+            try:
+                backfill_student_stats()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
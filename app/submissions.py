@@ -0,0 +1,49 @@
+"""Persistence of graded quiz attempts.
+
+An attempt and all of its per-question answers are written with two Core INSERT
+statements (the answers as a single executemany batch) instead of one ORM object per
+question flushed through the unit of work. This keeps the write transaction, and
+therefore SQLite's write lock, as short as possible.
+"""
+from .models import db, QuizAttempt, AttemptAnswer, SubmissionReceipt
+from .stats import record_attempt
+from .rollups import record_daily
+
+
+def answer_rows(attempt_id, details):
+    return [
+        {
+            'attempt_id': attempt_id,
+            'question_id': d.get('question_id'),
+            'given_answer': str(d.get('given')) if d.get('given') is not None else None,
+            'is_correct': d.get('is_correct'),
+        }
+        for d in details
+    ]
+
+
+def save_attempt(student_id, quiz_id, subject_id, score, percent, time_taken_seconds, details, completed_at, ticket=None):
+    """Insert an attempt, its answers and the summary updates; returns the attempt id.
+
+    `ticket` is the journal ticket of a write-behind submission, recorded alongside
+    the attempt. The caller owns the transaction (commit/rollback).
+    """
+    result = db.session.execute(
+        QuizAttempt.__table__.insert().values(
+            quiz_id=quiz_id,
+            student_id=student_id,
+            completed_at=completed_at,
+            score=score,
+            percent=percent,
+            time_taken_seconds=time_taken_seconds,
+        )
+    )
+    attempt_id = result.inserted_primary_key[0]
+    if details:
+        db.session.execute(AttemptAnswer.__table__.insert(), answer_rows(attempt_id, details))
+    if ticket:
+        db.session.execute(SubmissionReceipt.__table__.insert().values(ticket=ticket, attempt_id=attempt_id))
+    # keep the student's summary rows in step within the same transaction
+    record_attempt(student_id, subject_id, percent, time_taken_seconds, completed_at)
+    record_daily(quiz_id, subject_id, student_id, percent, time_taken_seconds, completed_at)
+    return attempt_id
@@ -0,0 +1,254 @@
+"""Initial schema
+
+Revision ID: 1e8c4d0b7a52
+Revises:
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e8c4d0b7a52'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# The schema frozen as of revision c4a1d9e6f370, so an empty database can be set up
+# by migrations alone. Databases created earlier by db.create_all() keep the tables
+# they have; the following revisions (written to skip what already exists) add their
+# missing columns and indexes. New revisions go on top as ordinary migrations.
+def tables():
+    return [
+        ('data_version', [
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('name'),
+        ]),
+        ('student', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=128), nullable=False),
+            sa.Column('daily_goal', sa.Integer(), nullable=False),
+            sa.Column('weekly_goal', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+        ]),
+        ('subject', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('code', sa.String(length=20), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('category', sa.String(length=50), nullable=True),
+            sa.Column('grade_level', sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('code'),
+            sa.UniqueConstraint('name'),
+        ]),
+        ('teacher', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=128), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+        ]),
+        ('conversation', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('teacher_id', sa.Integer(), nullable=True),
+            sa.Column('student_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('daily_student_stats', [
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('attempts_count', sa.Integer(), nullable=False),
+            sa.Column('percent_sum', sa.Float(), nullable=False),
+            sa.Column('percent_count', sa.Integer(), nullable=False),
+            sa.Column('time_sum', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.PrimaryKeyConstraint('day', 'student_id'),
+        ]),
+        ('daily_subject_stats', [
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('subject_id', sa.Integer(), nullable=False),
+            sa.Column('attempts_count', sa.Integer(), nullable=False),
+            sa.Column('percent_sum', sa.Float(), nullable=False),
+            sa.Column('percent_count', sa.Integer(), nullable=False),
+            sa.Column('time_sum', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+            sa.PrimaryKeyConstraint('day', 'subject_id'),
+        ]),
+        ('quiz', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('time_limit', sa.Integer(), nullable=True),
+            sa.Column('difficulty', sa.String(length=50), nullable=True),
+            sa.Column('teacher_id', sa.Integer(), nullable=True),
+            sa.Column('subject_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+            sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+            sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('student_stats', [
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('attempts_count', sa.Integer(), nullable=False),
+            sa.Column('percent_sum', sa.Float(), nullable=False),
+            sa.Column('percent_count', sa.Integer(), nullable=False),
+            sa.Column('time_sum', sa.Integer(), nullable=False),
+            sa.Column('last_completed_at', sa.DateTime(), nullable=True),
+            sa.Column('current_streak', sa.Integer(), nullable=False),
+            sa.Column('longest_streak', sa.Integer(), nullable=False),
+            sa.Column('last_active_day', sa.Date(), nullable=True),
+            sa.Column('day_window', sa.Date(), nullable=True),
+            sa.Column('day_count', sa.Integer(), nullable=False),
+            sa.Column('week_window', sa.Date(), nullable=True),
+            sa.Column('week_count', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.PrimaryKeyConstraint('student_id'),
+        ]),
+        ('student_subject_stats', [
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('subject_id', sa.Integer(), nullable=False),
+            sa.Column('attempts_count', sa.Integer(), nullable=False),
+            sa.Column('percent_sum', sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+            sa.PrimaryKeyConstraint('student_id', 'subject_id'),
+        ]),
+        ('daily_quiz_stats', [
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('quiz_id', sa.Integer(), nullable=False),
+            sa.Column('attempts_count', sa.Integer(), nullable=False),
+            sa.Column('percent_sum', sa.Float(), nullable=False),
+            sa.Column('percent_count', sa.Integer(), nullable=False),
+            sa.Column('time_sum', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id']),
+            sa.PrimaryKeyConstraint('day', 'quiz_id'),
+        ]),
+        ('message', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('sender_role', sa.String(length=20), nullable=False),
+            sa.Column('sender_id', sa.Integer(), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('read', sa.Boolean(), nullable=False),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('message_event', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('question', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('quiz_id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(length=20), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('correct_answer', sa.String(length=10), nullable=False),
+            sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('quiz_attempt', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('quiz_id', sa.Integer(), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.Column('score', sa.Integer(), nullable=True),
+            sa.Column('percent', sa.Float(), nullable=True),
+            sa.Column('time_taken_seconds', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id']),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('quiz_delivery', [
+            sa.Column('quiz_id', sa.Integer(), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('etag', sa.String(length=64), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('built_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id']),
+            sa.PrimaryKeyConstraint('quiz_id'),
+        ]),
+        ('attempt_answer', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('attempt_id', sa.Integer(), nullable=False),
+            sa.Column('question_id', sa.Integer(), nullable=True),
+            sa.Column('given_answer', sa.String(length=200), nullable=True),
+            sa.Column('is_correct', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['attempt_id'], ['quiz_attempt.id']),
+            sa.ForeignKeyConstraint(['question_id'], ['question.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('option', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('question_id', sa.Integer(), nullable=False),
+            sa.Column('key', sa.String(length=5), nullable=False),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.ForeignKeyConstraint(['question_id'], ['question.id']),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('submission_receipt', [
+            sa.Column('ticket', sa.String(length=32), nullable=False),
+            sa.Column('attempt_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['attempt_id'], ['quiz_attempt.id']),
+            sa.PrimaryKeyConstraint('ticket'),
+        ]),
+    ]
+
+
+# (index name, table, columns) of the tables above
+INDEXES = [
+    ('ix_conversation_student_id', 'conversation', ['student_id']),
+    ('ix_conversation_teacher_id_student_id', 'conversation', ['teacher_id', 'student_id']),
+    ('ix_quiz_created_at', 'quiz', ['created_at']),
+    ('ix_quiz_subject_id', 'quiz', ['subject_id']),
+    ('ix_quiz_teacher_id_created_at', 'quiz', ['teacher_id', 'created_at']),
+    ('ix_student_stats_updated_at', 'student_stats', ['updated_at']),
+    ('ix_daily_quiz_stats_quiz_id', 'daily_quiz_stats', ['quiz_id']),
+    ('ix_message_conversation_id_id', 'message', ['conversation_id', 'id']),
+    ('ix_message_conversation_id_sender_role_read', 'message', ['conversation_id', 'sender_role', 'read']),
+    ('ix_message_event_conversation_id_id', 'message_event', ['conversation_id', 'id']),
+    ('ix_question_quiz_id', 'question', ['quiz_id']),
+    ('ix_quiz_attempt_completed_at', 'quiz_attempt', ['completed_at']),
+    ('ix_quiz_attempt_quiz_id', 'quiz_attempt', ['quiz_id']),
+    ('ix_quiz_attempt_student_id_completed_at', 'quiz_attempt', ['student_id', 'completed_at']),
+    ('ix_attempt_answer_attempt_id', 'attempt_answer', ['attempt_id']),
+    ('ix_attempt_answer_question_id', 'attempt_answer', ['question_id']),
+    ('ix_option_question_id', 'option', ['question_id']),
+]
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    created = set()
+    for name, elements in tables():
+        if name not in existing:
+            op.create_table(name, *elements)
+            created.add(name)
+    for name, table, columns in INDEXES:
+        if table in created:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, _ in reversed(tables()):
+        op.drop_table(name, if_exists=True)
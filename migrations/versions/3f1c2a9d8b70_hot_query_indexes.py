@@ -0,0 +1,44 @@
+"""Indexes for the hot queries
+
+Revision ID: 3f1c2a9d8b70
+Revises: 9a4e6b2c1d05
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b70'
+down_revision = '9a4e6b2c1d05'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns); scripts/check_query_plans.py checks the queries
+# these serve. if_not_exists: databases created after this change already have them.
+INDEXES = [
+    ('ix_quiz_attempt_student_id_completed_at', 'quiz_attempt', ['student_id', 'completed_at']),
+    ('ix_quiz_attempt_quiz_id', 'quiz_attempt', ['quiz_id']),
+    ('ix_attempt_answer_attempt_id', 'attempt_answer', ['attempt_id']),
+    ('ix_quiz_teacher_id_created_at', 'quiz', ['teacher_id', 'created_at']),
+    ('ix_quiz_created_at', 'quiz', ['created_at']),
+    ('ix_quiz_subject_id', 'quiz', ['subject_id']),
+    ('ix_question_quiz_id', 'question', ['quiz_id']),
+    ('ix_option_question_id', 'option', ['question_id']),
+    ('ix_conversation_teacher_id_student_id', 'conversation', ['teacher_id', 'student_id']),
+    ('ix_conversation_student_id', 'conversation', ['student_id']),
+    ('ix_message_conversation_id_id', 'message', ['conversation_id', 'id']),
+    ('ix_message_conversation_id_sender_role_read', 'message', ['conversation_id', 'sender_role', 'read']),
+    ('ix_daily_quiz_stats_quiz_id', 'daily_quiz_stats', ['quiz_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,24 @@
+"""Index attempt answers by question
+
+Revision ID: 5d2e7b41c9a3
+Revises: 3f1c2a9d8b70
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e7b41c9a3'
+down_revision = '3f1c2a9d8b70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # quiz edits delete the answers of removed questions
+    op.create_index('ix_attempt_answer_question_id', 'attempt_answer', ['question_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_attempt_answer_question_id', table_name='attempt_answer', if_exists=True)
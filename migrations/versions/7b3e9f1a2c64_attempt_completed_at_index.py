@@ -0,0 +1,24 @@
+"""Index attempts by completion time
+
+Revision ID: 7b3e9f1a2c64
+Revises: 5d2e7b41c9a3
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e9f1a2c64'
+down_revision = '5d2e7b41c9a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # rollup rebuilds select the attempts of given days by completed_at range
+    op.create_index('ix_quiz_attempt_completed_at', 'quiz_attempt', ['completed_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_quiz_attempt_completed_at', table_name='quiz_attempt', if_exists=True)
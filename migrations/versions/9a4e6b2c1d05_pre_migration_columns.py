@@ -0,0 +1,48 @@
+"""Columns previously added by the scripts/add_*.py helpers
+
+Revision ID: 9a4e6b2c1d05
+Revises: 1e8c4d0b7a52
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6b2c1d05'
+down_revision = '1e8c4d0b7a52'
+branch_labels = None
+depends_on = None
+
+
+# (table, column); each is skipped when the helper script already added it
+COLUMNS = [
+    ('quiz', sa.Column('created_at', sa.DateTime(), nullable=True)),
+    ('quiz', sa.Column('version', sa.Integer(), nullable=False, server_default='1')),
+    ('student', sa.Column('daily_goal', sa.Integer(), nullable=False, server_default='1')),
+    ('student', sa.Column('weekly_goal', sa.Integer(), nullable=False, server_default='5')),
+    ('student_stats', sa.Column('longest_streak', sa.Integer(), nullable=False, server_default='0')),
+]
+
+
+def _existing(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    for table, column in COLUMNS:
+        existing = _existing(table)
+        # tables that do not exist yet are created complete by the initial revision
+        if existing is None or column.name in existing:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(column.copy())
+
+
+def downgrade():
+    # the columns predate the migrations; keep them
+    pass
@@ -0,0 +1,30 @@
+"""Keep the answers of removed questions
+
+Revision ID: c4a1d9e6f370
+Revises: 7b3e9f1a2c64
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a1d9e6f370'
+down_revision = '7b3e9f1a2c64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # quiz edits detach the answers of removed questions instead of deleting them
+    columns = {c['name']: c for c in sa.inspect(op.get_bind()).get_columns('attempt_answer')}
+    if columns['question_id']['nullable']:
+        return
+    with op.batch_alter_table('attempt_answer') as batch_op:
+        batch_op.alter_column('question_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    # detached answers have no question to point at again; keep the column nullable
+    pass
@@ -0,0 +1,31 @@
+# Simple migration helper: add longest_streak column to student_stats table if missing
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'agriquest.db')
+
+def column_exists(conn, table, column):
+    cur = conn.execute(f"PRAGMA table_info('{table}')")
+    cols = [r[1] for r in cur.fetchall()]
+    return column in cols
+
+if __name__ == '__main__':
+    if not os.path.exists(DB_PATH):
+        print('Database not found at', DB_PATH)
+        raise SystemExit(1)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not conn.execute("PRAGMA table_info('student_stats')").fetchall():
+            print('student_stats does not exist yet; it is created with the column on app start')
+        elif not column_exists(conn, 'student_stats', 'longest_streak'):
+            print('Adding longest_streak column')
+            conn.execute("ALTER TABLE student_stats ADD COLUMN longest_streak INTEGER DEFAULT 0 NOT NULL")
+            # summaries are rebuilt lazily; drop them so streak history is recomputed
+            conn.execute("DELETE FROM student_subject_stats")
+            conn.execute("DELETE FROM student_stats")
+        else:
+            print('longest_streak exists')
+        conn.commit()
+        print('Migration complete')
+    finally:
+        conn.close()
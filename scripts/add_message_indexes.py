@@ -0,0 +1,17 @@
+# Simple migration helper: add the (conversation_id, id) index used to page message history
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'agriquest.db')
+
+if __name__ == '__main__':
+    if not os.path.exists(DB_PATH):
+        print('Database not found at', DB_PATH)
+        raise SystemExit(1)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_message_conversation_id_id ON message (conversation_id, id)")
+        conn.commit()
+        print('Migration complete')
+    finally:
+        conn.close()
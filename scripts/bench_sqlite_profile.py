@@ -0,0 +1,132 @@
+"""Benchmark concurrent read/write throughput with and without the SQLite profile.
+
+Starts several worker processes (like gunicorn workers) against one throwaway
+SQLite database. Each worker mixes quiz submissions (writes) with dashboard and
+catalog reads for a fixed time. The same load runs once with SQLite's defaults
+(SQLITE_PRAGMAS = None) and once with the configured profile. Reports operations
+per second and how many operations failed with "database is locked".
+
+Usage:
+    python scripts/bench_sqlite_profile.py
+    python scripts/bench_sqlite_profile.py --workers 8 --seconds 10 --write-ratio 0.3
+"""
+import sys
+import os
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import datetime
+
+# Ensure project root is on sys.path so `app` package can be imported when running this script directly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy.exc import OperationalError
+
+import config
+from app import create_app
+from app.models import db, Student, Subject, Quiz, Question
+from app.stats import get_student_stats
+from app.catalog import catalog_page, parse_filters
+from app.submissions import save_attempt
+
+STUDENTS = 50
+QUESTIONS = 20
+
+
+def make_app(path, pragmas):
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    config.Config.SQLITE_PRAGMAS = pragmas
+    return create_app()
+
+
+def seed(path, pragmas):
+    app = make_app(path, pragmas)
+    with app.app_context():
+        subject = Subject(name='Bench Subject')
+        db.session.add(subject)
+        db.session.flush()
+        quiz = Quiz(title='Bench Quiz', subject_id=subject.id, time_limit=10)
+        db.session.add(quiz)
+        db.session.flush()
+        db.session.execute(Question.__table__.insert(), [
+            {'quiz_id': quiz.id, 'type': 'tf', 'text': f'Q{i}', 'correct_answer': 'True'} for i in range(QUESTIONS)
+        ])
+        for i in range(STUDENTS):
+            student = Student(name=f'Student {i}', email=f'bench{i}@example.com', password_hash='x')
+            db.session.add(student)
+        db.session.commit()
+        question_ids = [q.id for q in Question.query.filter_by(quiz_id=quiz.id).all()]
+        student_ids = [s.id for s in Student.query.all()]
+        return quiz.id, subject.id, question_ids, student_ids
+
+
+def worker(path, pragmas, seconds, write_ratio, quiz_id, subject_id, question_ids, student_ids, results):
+    app = make_app(path, pragmas)
+    details = [{'question_id': qid, 'given': 'True', 'correct_answer': 'True', 'is_correct': True} for qid in question_ids]
+    reads = writes = locked = 0
+    rng = random.Random(os.getpid())
+    deadline = time.monotonic() + seconds
+    with app.app_context():
+        while time.monotonic() < deadline:
+            student_id = rng.choice(student_ids)
+            try:
+                if rng.random() < write_ratio:
+                    save_attempt(student_id, quiz_id, subject_id, len(details), 100.0, 30, details, datetime.utcnow())
+                    db.session.commit()
+                    writes += 1
+                else:
+                    get_student_stats(student_id)
+                    catalog_page(parse_filters({}))
+                    db.session.commit()
+                    reads += 1
+            except OperationalError as exc:
+                db.session.rollback()
+                if 'locked' not in str(exc):
+                    raise
+                locked += 1
+    results.put((reads, writes, locked))
+
+
+def run(label, pragmas, args):
+    tmpdir = tempfile.mkdtemp(prefix='agriquest-sqlite-')
+    path = os.path.join(tmpdir, 'bench.db')
+    quiz_id, subject_id, question_ids, student_ids = seed(path, pragmas)
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(path, pragmas, args.seconds, args.write_ratio, quiz_id, subject_id, question_ids, student_ids, results))
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+    totals = [0, 0, 0]
+    for _ in procs:
+        for i, value in enumerate(results.get()):
+            totals[i] += value
+    for p in procs:
+        p.join()
+    reads, writes, locked = totals
+    print(f"{label:>10} {reads / args.seconds:>10.1f} {writes / args.seconds:>10.1f} {locked:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite connection profile")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent worker processes")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="share of operations that submit an attempt")
+    args = parser.parse_args()
+
+    profile = dict(config.Config.SQLITE_PRAGMAS or {})
+    print(f"{args.workers} workers, {args.seconds:g}s per run, {args.write_ratio:.0%} writes")
+    print(f"{'profile':>10} {'reads/s':>10} {'writes/s':>10} {'locked':>8}")
+    run('defaults', None, args)
+    run('tuned', profile, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
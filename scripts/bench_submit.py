@@ -0,0 +1,98 @@
+"""Benchmark attempt persistence latency against quiz size.
+
+Compares the previous per-row ORM path (one AttemptAnswer object per question,
+flushed through the unit of work) with the batched insert used by
+app.submissions.save_attempt. Runs against a throwaway SQLite database.
+
+Usage:
+    python scripts/bench_submit.py                 # 10, 50, 100, 200, 500 questions
+    python scripts/bench_submit.py --sizes 100 1000 --repeat 50
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+import statistics
+from datetime import datetime
+
+# Ensure project root is on sys.path so `app` package can be imported when running this script directly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import config
+from app import create_app
+from app.models import db, Student, Subject, Quiz, Question, QuizAttempt, AttemptAnswer
+from app.rollups import record_daily
+from app.stats import record_attempt
+from app.submissions import save_attempt
+
+
+def make_quiz(size, subject_id):
+    quiz = Quiz(title=f'Bench {size}', subject_id=subject_id, time_limit=10)
+    db.session.add(quiz)
+    db.session.flush()
+    db.session.execute(Question.__table__.insert(), [
+        {'quiz_id': quiz.id, 'type': 'tf', 'text': f'Q{i}', 'correct_answer': 'True'} for i in range(size)
+    ])
+    db.session.commit()
+    ids = [q.id for q in Question.query.filter_by(quiz_id=quiz.id).all()]
+    details = [{'question_id': qid, 'given': 'True', 'correct_answer': 'True', 'is_correct': True} for qid in ids]
+    return quiz, details
+
+
+def orm_path(student_id, quiz, details):
+    completed_at = datetime.utcnow()
+    attempt = QuizAttempt(quiz_id=quiz.id, student_id=student_id, completed_at=completed_at, score=len(details), percent=100.0, time_taken_seconds=30)
+    db.session.add(attempt)
+    db.session.flush()
+    for d in details:
+        db.session.add(AttemptAnswer(attempt_id=attempt.id, question_id=d['question_id'], given_answer=str(d['given']), is_correct=d['is_correct']))
+    # the same summary and rollup writes as save_attempt, so only the answer inserts differ
+    record_attempt(student_id, quiz.subject_id, 100.0, 30, completed_at)
+    record_daily(quiz.id, quiz.subject_id, student_id, 100.0, 30, completed_at)
+    db.session.commit()
+
+
+def bulk_path(student_id, quiz, details):
+    save_attempt(student_id, quiz.id, quiz.subject_id, len(details), 100.0, 30, details, datetime.utcnow())
+    db.session.commit()
+
+
+def timed(fn, repeat, *args):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quiz submission persistence")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500], help="question counts to test")
+    parser.add_argument("--repeat", type=int, default=20, help="submissions per size and path")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='agriquest-bench-')
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+    app = create_app()
+    with app.app_context():
+        student = Student(name='Bench Student', email='bench@example.com')
+        student.set_password('password')
+        subject = Subject(name='Bench Subject')
+        db.session.add_all([student, subject])
+        db.session.commit()
+
+        print(f"{'questions':>10} {'orm ms':>10} {'bulk ms':>10} {'speedup':>8}")
+        for size in args.sizes:
+            quiz, details = make_quiz(size, subject.id)
+            orm_ms = timed(orm_path, args.repeat, student.id, quiz, details)
+            bulk_ms = timed(bulk_path, args.repeat, student.id, quiz, details)
+            print(f"{size:>10} {orm_ms:>10.2f} {bulk_ms:>10.2f} {orm_ms / bulk_ms:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Check that the hot queries are served by indexes.
+
+Runs EXPLAIN QUERY PLAN over the queries behind the dashboards, progress pages,
+exports, messaging and grading, and fails if any of them scans a whole table.
+By default the schema is created fresh in a throwaway database (checks the
+indexes declared in app/models.py); pass --database to check an existing
+database, e.g. after `flask --app run db upgrade`.
+
+Usage:
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --database instance/agriquest.db -v
+"""
+import sys
+import os
+import re
+import argparse
+import tempfile
+from datetime import date
+
+# Ensure project root is on sys.path so `app` package can be imported when running this script directly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy import func, update
+
+import config
+from app import create_app
+from app.models import (
+    db, Quiz, Question, Option, QuizAttempt, AttemptAnswer, Conversation, Message,
+    MessageEvent, StudentStats, SubmissionReceipt, DailyQuizStats,
+)
+from app.catalog import question_count
+from app.inbox import inbox_query
+from app.rollups import completed_on
+
+SINCE = '2026-01-01'
+
+
+def hot_queries():
+    """(name, statement) for every query that must not scan a table."""
+    q = db.session.query
+    unread = (Message.sender_role == 'student', Message.read == False)
+    return [
+        ('recent attempts of a student',
+         q(QuizAttempt).filter(QuizAttempt.student_id == 1).order_by(QuizAttempt.completed_at.desc()).limit(25)),
+        ('completed attempts of a student (exports)',
+         q(QuizAttempt).filter(QuizAttempt.student_id == 1, QuizAttempt.completed_at != None).order_by(QuizAttempt.completed_at.desc()).limit(50)),
+        ('attempts of a quiz (delete)',
+         q(QuizAttempt.id).filter(QuizAttempt.quiz_id == 1)),
+        ('answers of an attempt (results)',
+         q(func.count(AttemptAnswer.id), func.sum(AttemptAnswer.is_correct)).filter(AttemptAnswer.attempt_id == 1)),
+        ('answers of attempts (delete)',
+         q(AttemptAnswer.id).filter(AttemptAnswer.attempt_id.in_([1, 2, 3]))),
+        ('answers of removed questions (quiz edit)',
+         q(AttemptAnswer.id).filter(AttemptAnswer.question_id.in_([1, 2, 3]))),
+        ('quizzes of a teacher',
+         q(Quiz).filter(Quiz.teacher_id == 1).order_by(Quiz.id.desc())),
+        ('new quizzes of a teacher',
+         q(func.count(Quiz.id)).filter(Quiz.teacher_id == 1, Quiz.created_at >= SINCE)),
+        ('latest quizzes',
+         q(Quiz).order_by(Quiz.created_at.desc()).limit(10)),
+        ('catalog page after a cursor',
+         q(Quiz, question_count()).filter(Quiz.id < 100).order_by(Quiz.id.desc()).limit(21)),
+        ('catalog page by subject',
+         q(Quiz, question_count()).filter(Quiz.subject_id == 1).order_by(Quiz.id.desc()).limit(21)),
+        ('questions of a quiz (answer key)',
+         q(Question.id, Question.correct_answer).filter(Question.quiz_id == 1)),
+        ('options of questions',
+         q(Option).filter(Option.question_id.in_([1, 2, 3]))),
+        ('teacher inbox',
+         inbox_query('teacher', 1)[0].limit(51)),
+        ('student inbox',
+         inbox_query('student', 1)[0].limit(51)),
+        ('conversation of a pair',
+         q(Conversation).filter(Conversation.teacher_id == 1, Conversation.student_id == 2)),
+        ('message history page',
+         q(Message).filter(Message.conversation_id == 1, Message.id < 500).order_by(Message.id.desc()).limit(51)),
+        ('unread messages',
+         q(func.count(Message.id)).filter(Message.conversation_id == 1, *unread)),
+        ('mark conversation read',
+         update(Message).where(Message.conversation_id == 1, *unread).values(read=True)),
+        ('message events after an id',
+         q(MessageEvent).filter(MessageEvent.conversation_id == 1, MessageEvent.id > 10).order_by(MessageEvent.id.asc()).limit(100)),
+        ('leaderboard sync',
+         q(StudentStats).filter(StudentStats.updated_at > SINCE)),
+        ('journal receipts',
+         q(SubmissionReceipt.ticket).filter(SubmissionReceipt.ticket.in_(['a', 'b']))),
+        ('analytics trend rollups',
+         q(func.sum(DailyQuizStats.percent_sum)).filter(DailyQuizStats.day >= SINCE)),
+        ('rollup days of a quiz',
+         q(DailyQuizStats.day).filter(DailyQuizStats.quiz_id == 1)),
+        ('attempts of rollup days (rebuild)',
+         q(QuizAttempt.id).filter(completed_on([date(2026, 1, 1), date(2026, 1, 2), date(2026, 3, 1)]))),
+    ]
+
+
+def explain(connection, statement):
+    stmt = statement.statement if hasattr(statement, 'statement') else statement
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup) if compiled.positiontup else ()
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), positional).fetchall()
+    return [r[-1] for r in rows]
+
+
+def full_scans(details, tables):
+    # "SCAN quiz" (or an alias of it) is a table scan; "SCAN quiz USING INDEX ..." and
+    # "SEARCH ..." are index lookups, scans of subqueries are not table scans
+    scans = []
+    for detail in details:
+        m = re.match(r'SCAN (\w+)(?: AS (\w+))?$', detail)
+        if m and (m.group(1) in tables or re.sub(r'_\d+$', '', m.group(1)) in tables):
+            scans.append(detail)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query does a full table scan")
+    parser.add_argument("--database", help="SQLite database file to check (default: fresh temporary schema)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.database) if args.database else os.path.join(tempfile.mkdtemp(prefix='agriquest-plans-'), 'plans.db')
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        tables = set(db.metadata.tables)
+        with db.engine.connect() as connection:
+            for name, statement in hot_queries():
+                details = explain(connection, statement)
+                scans = full_scans(details, tables)
+                status = 'FAIL' if scans else 'ok'
+                print(f"{status:>4}  {name}" + (f"  ({'; '.join(scans)})" if scans else ''))
+                if args.verbose:
+                    for detail in details:
+                        print(f"        {detail}")
+                failures += bool(scans)
+    if failures:
+        print(f"{failures} hot queries scan a whole table")
+        return 1
+    print("All hot queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
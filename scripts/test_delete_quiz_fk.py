@@ -0,0 +1,101 @@
+"""Delete a quiz with foreign keys enforced.
+
+PostgreSQL always enforces foreign keys; SQLite only with PRAGMA foreign_keys=ON,
+which this script turns on for a throwaway database. A quiz with attempts (one of
+them journaled, with a SubmissionReceipt), rollups, a delivery payload and a search
+index entry is deleted through the route, which must succeed and leave no rows
+pointing at it.
+
+Usage:
+    python scripts/test_delete_quiz_fk.py
+"""
+import sys
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+# Ensure project root is on sys.path so `app` package can be imported when running this script directly
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import config
+
+path = os.path.join(tempfile.mkdtemp(prefix='agriquest-fk-'), 'fk.db')
+config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+config.Config.SQLITE_PRAGMAS = dict(config.Config.SQLITE_PRAGMAS, foreign_keys='ON')
+
+from app import create_app
+from app.models import (
+    db, Teacher, Student, Quiz, Question, Option, QuizAttempt, AttemptAnswer, SubmissionReceipt,
+    QuizDelivery, DailyQuizStats, StudentStats,
+)
+from app.submissions import save_attempt
+
+app = create_app()
+client = app.test_client()
+
+with app.app_context():
+    assert db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1, 'foreign keys are not enforced'
+    teacher = Teacher(name='FK Teacher', email='fk_teacher@example.com')
+    teacher.set_password('password')
+    student = Student(name='FK Student', email='fk_student@example.com')
+    student.set_password('password')
+    db.session.add_all([teacher, student])
+    db.session.commit()
+    teacher_id, student_id = teacher.id, student.id
+
+with client.session_transaction() as sess:
+    sess['teacher_id'] = teacher_id
+resp = client.post('/teacher/quizzes/create', json={
+    'title': 'Foreign keys', 'subject': 'Agriculture', 'time_limit': 5, 'difficulty': 'Beginner',
+    'questions': [
+        {'type': 'mc', 'text': 'Which is a crop?', 'correct': 'A', 'options': [{'key': 'A', 'text': 'Rice'}, {'key': 'B', 'text': 'Car'}]},
+        {'type': 'tf', 'text': 'Soil holds water', 'correct': 'True'},
+    ],
+})
+print('create', resp.status_code)
+assert resp.status_code in (200, 201), resp.get_data(as_text=True)
+quiz_id = resp.get_json()['quiz_id']
+
+with app.app_context():
+    quiz = db.session.get(Quiz, quiz_id)
+    details = [{'question_id': q.id, 'given': 'A', 'is_correct': True} for q in quiz.questions]
+    # one direct submission and one written by the journal (with its receipt)
+    save_attempt(student_id, quiz_id, quiz.subject_id, 2, 100.0, 30, details, datetime.utcnow())
+    save_attempt(student_id, quiz_id, quiz.subject_id, 1, 50.0, 40, details, datetime.utcnow(), ticket=uuid.uuid4().hex)
+    db.session.commit()
+
+# opening the quiz stores its delivery payload
+with client.session_transaction() as sess:
+    sess.clear()
+    sess['student_id'] = student_id
+print('take', client.get(f'/student/quizzes/take/{quiz_id}').status_code)
+
+with client.session_transaction() as sess:
+    sess.clear()
+    sess['teacher_id'] = teacher_id
+resp = client.post(f'/teacher/quizzes/delete/{quiz_id}')
+print('delete', resp.status_code, resp.get_json())
+assert resp.status_code == 200, resp.get_json()
+
+with app.app_context():
+    left = {
+        'quiz': Quiz.query.filter_by(id=quiz_id).count(),
+        'question': Question.query.filter_by(quiz_id=quiz_id).count(),
+        'option': Option.query.count(),
+        'quiz_attempt': QuizAttempt.query.count(),
+        'attempt_answer': AttemptAnswer.query.count(),
+        'submission_receipt': SubmissionReceipt.query.count(),
+        'quiz_delivery': QuizDelivery.query.count(),
+        'daily_quiz_stats': DailyQuizStats.query.count(),
+    }
+    print('rows left', left)
+    assert not any(left.values()), left
+    stats = db.session.get(StudentStats, student_id)
+    assert stats is not None and stats.attempts_count == 0, 'student summary still counts the deleted attempts'
+    violations = db.session.execute(db.text('PRAGMA foreign_key_check')).fetchall()
+    assert not violations, violations
+
+print('OK')